@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the API clients and the heatmap path against the local
+stand-in server.
+
+Usage: python benchmarks/bench_api.py [--latency 0.02] [--images 20] ...
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import time
+import asyncio
+import argparse
+
+from pickthat import API, AsyncAPI
+
+from fakeserver import serve
+
+
+class Timer(object):
+    """
+    Time a block, and count what the server sent during it.
+    """
+    def __init__(self, server, name):
+        self.server = server
+        self.name = name
+
+    def __enter__(self):
+        self.requests = self.server.requests
+        self.bytes = self.server.bytes_sent
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        t = time.time() - self.t0
+        requests = self.server.requests - self.requests
+        nbytes = self.server.bytes_sent - self.bytes
+        s = "{:<28} {:7.3f} s {:8.1f} req/s {:9.2f} MB/s"
+        print(s.format(self.name, t, requests / t, nbytes / t / 1e6))
+
+
+def sync_picks(api, image_ids):
+    for image_id in image_ids:
+        api.picks(image_id=image_id)
+
+
+def async_picks(url, image_ids, concurrency):
+    async def run():
+        async with AsyncAPI(url, concurrency=concurrency) as api:
+            return await api.gather_picks(image_ids)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def heatmap(api, image, max_size=None):
+    im = image.image(max_size=max_size)
+    picks = api.picks(image_id=image.id)
+    return im, image.heatmap(picks, scale=image.scale_factor(max_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--points', type=int, default=50)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    server, url = serve(latency=args.latency,
+                        n_images=args.images,
+                        n_users=args.users,
+                        n_points=args.points,
+                        width=args.width,
+                        height=args.height)
+    image_ids = [image['id'] for image in server.images]
+
+    print("{} images, {} users, {} points, {:.0f} ms latency".format(
+        args.images, args.users, args.points, 1000 * args.latency))
+
+    with API(url) as api:
+        with Timer(server, "sync picks"):
+            sync_picks(api, image_ids)
+
+    with Timer(server, "AsyncAPI.gather_picks"):
+        async_picks(url, image_ids, args.concurrency)
+
+    with API(url, pool_maxsize=args.concurrency) as api:
+        with Timer(server, "API.fetch_corpus"):
+            api.fetch_corpus(max_workers=args.concurrency)
+
+    with API(url) as api:
+        image = api.images(image_id=image_ids[0])[0]
+        with Timer(server, "heatmap, full size"):
+            heatmap(api, image)
+        with Timer(server, "heatmap, max_size=200"):
+            heatmap(api, image, max_size=200)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare sequential API.picks() calls with AsyncAPI.gather_picks().
+
+Usage: python benchmarks/bench_async.py [latency]
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import sys
+import time
+import asyncio
+
+from pickthat import API, AsyncAPI
+
+from fakeserver import serve
+
+
+def main(latency=0.05):
+    server, url = serve(latency=latency, n_images=40)
+    image_ids = [image['id'] for image in server.images]
+
+    with API(url) as api:
+        t0 = time.time()
+        for image_id in image_ids:
+            api.picks(image_id=image_id)
+        sync = time.time() - t0
+
+    async def run():
+        async with AsyncAPI(url, concurrency=8) as api:
+            return await api.gather_picks(image_ids)
+
+    loop = asyncio.new_event_loop()
+    t0 = time.time()
+    loop.run_until_complete(run())
+    concurrent = time.time() - t0
+    loop.close()
+
+    print("{} images, {:.0f} ms latency".format(len(image_ids), 1000 * latency))
+    print("sequential API:   {:.2f} s".format(sync))
+    print("AsyncAPI x 8:     {:.2f} s".format(concurrent))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[float(a) for a in sys.argv[1:]])
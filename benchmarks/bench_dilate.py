@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Time the dilation of heatmap layers on large seismic-sized images.
+
+Usage: python benchmarks/bench_dilate.py
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import numpy as np
+
+from pickthat import pt
+from pickthat.image import Image
+
+from timing import best_of
+
+
+def user_layer(image, seed=0):
+    """
+    A layer with a few horizons drawn on it, like a user's picks.
+    """
+    rng = np.random.RandomState(seed)
+    w, h = image.width, image.height
+    layer = np.zeros((h, w), dtype=np.float32)
+    for group in range(5):
+        x = np.linspace(0, w - 1, 500).astype(int)
+        y = np.clip(rng.randint(h) + np.cumsum(rng.randint(-3, 4, x.size)), 0, h - 1)
+        layer = pt.draw_pick_to_user_layer(layer, np.c_[x, y], image)
+    return layer.astype(int)
+
+
+def main():
+    print("{:>11} {:>4} {:>10} {:>10} {:>10} {:>8}".format(
+        'image', 'r', 'dense ms', 'edt ms', 'sparse ms', 'speedup'))
+    for w, h in ((1000, 750), (2000, 1500), (4000, 3000)):
+        image = Image({'width': w, 'height': h, 'pickstyle': 'lines'})
+        layer = user_layer(image)
+        r = pt.calculate_disk_radius(image)
+
+        t_dense = best_of(lambda: pt.dilate_disk(layer, r, method='dense'))
+        t_edt = best_of(lambda: pt.dilate_disk(layer, r, method='edt'))
+        t_sparse = best_of(lambda: pt.dilate_disk(layer, r, method='sparse'))
+        print("{:>11} {:>4} {:>10.1f} {:>10.1f} {:>10.1f} {:>7.0f}x".format(
+            '{}x{}'.format(w, h), r, 1000 * t_dense, 1000 * t_edt,
+            1000 * t_sparse, t_dense / min(t_edt, t_sparse)))
+
+if __name__ == '__main__':
+    main()
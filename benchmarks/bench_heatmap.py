@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Time the heatmap layer path on a dense line-pick image.
+
+Usage: python benchmarks/bench_heatmap.py [width height points]
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import sys
+import json
+
+import numpy as np
+
+from pickthat import pt
+from pickthat.image import Image
+
+from timing import best_of
+
+
+def dense_line(width, height, n_points):
+    x = np.linspace(0, width - 1, n_points).astype(int)
+    y = (height / 2. + height / 4. * np.sin(x / 25.)).astype(int)
+    return np.c_[x, y]
+
+
+def main(width=2000, height=1500, n_points=4000):
+    width, height, n_points = int(width), int(height), int(n_points)
+    image = Image({'width': width, 'height': height, 'pickstyle': 'lines'})
+    picks = dense_line(width, height, n_points)
+
+    print("{} x {} image, {} points".format(width, height, n_points))
+
+    def json_path():
+        pt.create_user_heatmap_layer(image, json.dumps(picks.tolist()), None)
+
+    def array_path():
+        pt.create_user_heatmap_layer(image, picks, None)
+
+    def parse_json():
+        pt.as_pick_array(json.dumps(picks.tolist()))
+
+    def parse_array():
+        pt.as_pick_array(picks)
+
+    print("coordinates via JSON: {:8.3f} ms".format(1000 * best_of(parse_json)))
+    print("coordinates as array: {:8.3f} ms".format(1000 * best_of(parse_array)))
+    print("layer via JSON:       {:8.1f} ms".format(1000 * best_of(json_path)))
+    print("layer from array:     {:8.1f} ms".format(1000 * best_of(array_path)))
+
+    # An interpretation in one corner only needs its own window.
+    corner = dense_line(width // 8, height // 8, n_points // 8)
+
+    def corner_full():
+        # Drawing and dilating the whole image, as layers used to be.
+        layer = np.zeros((height, width), dtype=np.float32)
+        layer = pt.draw_all_picks_to_user_layer(layer, corner, image)
+        pt.dilate_disk(layer.astype(int), pt.calculate_disk_radius(image))
+
+    def corner_layer():
+        pt.create_user_heatmap_layer(image, corner, None)
+
+    def corner_window():
+        pt.create_user_heatmap_window(image, corner, None)
+
+    window, _, _ = pt.create_user_heatmap_window(image, corner, None)
+    print("corner, full image:   {:8.1f} ms".format(1000 * best_of(corner_full)))
+    print("corner, as layer:     {:8.1f} ms".format(1000 * best_of(corner_layer)))
+    print("corner, window:       {:8.1f} ms, {} x {}".format(
+        1000 * best_of(corner_window), window.shape[1], window.shape[0]))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
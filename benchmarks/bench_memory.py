@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the memory used by Pick objects with plain dict-backed objects.
+
+Usage: python benchmarks/bench_memory.py [n]
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import sys
+import tracemalloc
+
+from pickthat.pick import Pick
+
+
+class DictPick(object):
+    """
+    The way Pick used to store its data.
+    """
+    def __init__(self, data):
+        self.__dict__ = dict(data)
+        for k, v in data.items():
+            if k and v:
+                setattr(self, k, v)
+
+
+def measure(cls, records):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [cls(r) for r in records]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / float(len(objects))
+
+
+def main(n=100000):
+    n = int(n)
+    coords = [[1, 2], [3, 4]]
+    records = [{'user_id': 'user{}'.format(i % 100),
+                'cohort': 'student',
+                'image_key': 'image{}'.format(i % 50),
+                'picks': coords,
+                }
+               for i in range(n)]
+
+    old = measure(DictPick, records)
+    new = measure(Pick, records)
+    print("{} picks".format(n))
+    print("dict-backed: {:6.0f} bytes per object".format(old))
+    print("__slots__:   {:6.0f} bytes per object".format(new))
+    print("saving:      {:6.0f} bytes per object ({:.0%})".format(old - new, 1 - new / old))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
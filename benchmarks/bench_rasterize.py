@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the vectorized polyline rasterizer with the per-segment loop
+it replaced, for increasing numbers of vertices. tests/test_pt.py
+checks the two draw exactly the same pixels.
+
+Usage: python benchmarks/bench_rasterize.py
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import numpy as np
+
+from pickthat import pt
+from pickthat.image import Image
+
+from reference import draw_loop
+from timing import best_of
+
+
+def main():
+    w, h = 2000, 1500
+    image = Image({'width': w, 'height': h, 'pickstyle': 'lines'})
+    rng = np.random.RandomState(1)
+    print("{:>8} {:>10} {:>12} {:>8}".format('vertices', 'loop ms', 'vector ms', 'speedup'))
+    for n in (10, 100, 1000, 10000):
+        # A horizon picked as a random walk across the image.
+        x = np.linspace(0, w - 1, n).astype(int)
+        y = np.clip(h // 2 + np.cumsum(rng.randint(-3, 4, n)), 0, h - 1)
+        picks = np.c_[x, y]
+        layer = np.zeros((h, w), np.float32)
+        t_loop = best_of(lambda: draw_loop(layer, picks, image))
+        t_vec = best_of(lambda: pt.draw_pick_to_user_layer(layer, picks, image))
+        print("{:>8} {:>10.2f} {:>12.2f} {:>7.0f}x".format(n, 1000 * t_loop,
+                                                          1000 * t_vec,
+                                                          t_loop / t_vec))
+
+    # The same horizons, split into 10 groups.
+    print("grouped, 10 segments")
+    for n in (100, 1000, 10000):
+        x = np.linspace(0, w - 1, n).astype(int)
+        y = np.clip(h // 2 + np.cumsum(rng.randint(-3, 4, n)), 0, h - 1)
+        picks = np.c_[x, y, np.arange(n) * 10 // n]
+        layer = np.zeros((h, w), np.float32)
+
+        def loop():
+            for group in range(10):
+                draw_loop(layer, picks[picks[:, 2] == group], image)
+
+        t_loop = best_of(loop)
+        t_vec = best_of(lambda: pt.draw_all_picks_to_user_layer(layer, picks, image))
+        print("{:>8} {:>10.2f} {:>12.2f} {:>7.0f}x".format(n, 1000 * t_loop,
+                                                          1000 * t_vec,
+                                                          t_loop / t_vec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Crawl an overloaded stand-in server with and without AdaptiveLimiter.
+
+Usage: python benchmarks/bench_ratelimit.py [capacity]
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import sys
+import time
+
+from pickthat.api import API, PickThisAPIError
+from pickthat.ratelimit import AdaptiveLimiter
+
+from fakeserver import serve
+
+
+def crawl(url, limiter=None, workers=16):
+    t0 = time.time()
+    try:
+        with API(url, pool_maxsize=workers, limiter=limiter) as api:
+            corpus = api.fetch_corpus(max_workers=workers)
+        result = "{} picks".format(len(corpus))
+    except PickThisAPIError as e:
+        result = "failed: {}".format(e)
+    return time.time() - t0, result
+
+
+def main(capacity=4):
+    server, url = serve(latency=0.02, capacity=int(capacity), n_images=100)
+
+    t, result = crawl(url)
+    print("no limiter:       {:6.2f} s  {}".format(t, result))
+
+    for workers in (1, 16):
+        limiter = AdaptiveLimiter(window=workers, max_window=workers,
+                                  backoff=0.05, retries=10)
+        t, result = crawl(url, limiter, workers=workers)
+        s = "limiter, {:2d} max:  {:6.2f} s  {}, {} throttled, window {:.1f}"
+        print(s.format(workers, t, result, limiter.throttled, limiter.window))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for the Pick This web API, for benchmarking.
+
+It serves api/images, api/picks and api/users from synthetic fixtures,
+and the images themselves as JPEGs. Responses carry an ETag, and
+conditional requests get 304 Not Modified.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import json
+import time
+import hashlib
+import threading
+from io import BytesIO
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+from PIL import Image as PImage
+
+
+def make_fixtures(n_images=10, n_users=20, n_points=50,
+                  width=800, height=600, pickstyle='lines'):
+    """
+    Make some synthetic images, users and picks. Each user picks a
+    wavy horizon of n_points points on every image.
+    """
+    images = [{'id': 'image{}'.format(i),
+               'width': width,
+               'height': height,
+               'pickstyle': pickstyle,
+               }
+              for i in range(n_images)]
+    users = [{'user_id': 'user{}'.format(u),
+              'cohort': ['student', 'professional'][u % 2],
+              }
+             for u in range(n_users)]
+
+    x = np.linspace(0, width - 1, n_points).astype(int)
+    picks = {}
+    for i, image in enumerate(images):
+        picks[image['id']] = []
+        for u, user in enumerate(users):
+            base = height * (0.2 + 0.6 * ((u + i) % 10) / 10.)
+            y = base + 0.05 * height * np.sin(x / 40. + u)
+            y = np.clip(y, 0, height - 1).astype(int)
+            picks[image['id']].append({'user_id': user['user_id'],
+                                       'cohort': user['cohort'],
+                                       'image_key': image['id'],
+                                       'picks': np.c_[x, y].tolist(),
+                                       })
+    return images, users, picks
+
+
+def make_raster(image, seed=0):
+    """
+    Make a JPEG that looks a bit like a seismic section.
+    """
+    w, h = image['width'], image['height']
+    rng = np.random.RandomState(seed)
+    y = np.arange(h)[:, None] + 10 * np.sin(np.arange(w)[None, :] / 50.)
+    trace = np.sin(y / 4.) * np.cos(y / 23.)
+    noise = 0.2 * rng.randn(h, w)
+    arr = (127.5 * (1 + np.clip(trace + noise, -1, 1))).astype(np.uint8)
+    buf = BytesIO()
+    PImage.fromarray(arr).convert('RGB').save(buf, 'jpeg', quality=90)
+    return buf.getvalue()
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            overloaded = (server.capacity is not None) and (server.active > server.capacity)
+        try:
+            time.sleep(server.latency)
+            if overloaded:
+                return self.send(429, b'', retry_after=server.retry_after)
+            return self.respond()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def respond(self):
+        server = self.server
+
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        content_type = 'application/json'
+        if url.path == '/api/images':
+            body = server.images
+            if 'image_id' in params:
+                body = [i for i in body if i['id'] == params['image_id']]
+        elif url.path == '/api/users':
+            body = server.users
+            if 'user_id' in params:
+                body = [u for u in body if u['user_id'] == params['user_id']]
+        elif url.path == '/api/picks':
+            body = server.picks.get(params.get('image_key'), [])
+        elif url.path.startswith('/images/'):
+            body = server.raster(url.path.split('/')[-1].split('.')[0])
+            content_type = 'image/jpeg'
+        else:
+            body = None
+
+        if body is None:
+            return self.send(404, b'')
+
+        if content_type == 'application/json':
+            body = json.dumps(body).encode('utf-8')
+
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            return self.send(304, b'', etag=etag)
+
+        return self.send(200, body, etag=etag, content_type=content_type)
+
+    def send(self, status, body, etag=None, content_type=None, retry_after=None):
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # Count before replying, so the client never sees stale counts.
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_sent += len(body)
+        self.wfile.write(body)
+
+
+def serve(latency=0.0, capacity=None, retry_after=None, **kwargs):
+    """
+    Start a server on a free local port, in a background thread.
+
+    The server counts the requests it answers and the bytes of body it
+    sends, in its requests and bytes_sent attributes.
+
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        capacity (int): Answer 429 Too Many Requests when more than this
+            many requests are in progress. None for no limit.
+        retry_after (int): The Retry-After header to send with a 429.
+        **kwargs: Passed to make_fixtures(), eg n_images, n_users,
+            n_points, width and height, to set the payload size.
+
+    Returns:
+        tuple. The server and its root URL.
+    """
+    server = ThreadingServer(('127.0.0.1', 0), Handler)
+    url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+
+    server.latency = latency
+    server.capacity = capacity
+    server.retry_after = retry_after
+    server.active = 0
+    server.images, server.users, server.picks = make_fixtures(**kwargs)
+    for image in server.images:
+        image['link'] = '{}images/{}.jpg'.format(url, image['id'])
+
+    rasters = {}
+    by_id = {image['id']: (i, image) for i, image in enumerate(server.images)}
+
+    def raster(image_id):
+        if image_id not in by_id:
+            return None
+        if image_id not in rasters:
+            i, image = by_id[image_id]
+            rasters[image_id] = make_raster(image, seed=i)
+        return rasters[image_id]
+
+    server.raster = raster
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.bytes_sent = 0
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, url
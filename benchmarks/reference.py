@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Reference implementations that the benchmarks and the tests compare
+the current code with.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import numpy as np
+
+from pickthat import pt
+
+
+def draw_loop(user_layer, picks, img_obj):
+    """
+    The original per-segment implementation of draw_pick_to_user_layer,
+    as a reference.
+    """
+    w = img_obj.width
+    h = img_obj.height
+    if img_obj.pickstyle == 'polygons':
+        agg = np.append(picks, picks[0])
+        picks = agg.reshape(picks.shape[0]+1, picks.shape[1])
+    for i, _ in enumerate(picks[:-1]):
+        xpair = picks[i:i+2, 0]
+        if xpair[0] > xpair[1]:
+            xpair = xpair[xpair[:].argsort()]
+            xrev = True
+        else:
+            xrev = False
+        ypair = picks[i:i+2, 1]
+        if ypair[0] > ypair[1]:
+            ypair = ypair[ypair[:].argsort()]
+            yrev = True
+        else:
+            yrev = False
+        x, y = pt.interpolate(xpair, ypair)
+        if xrev:
+            x = x[::-1]
+        if yrev:
+            y = y[::-1]
+        x[x >= w] = w - 1
+        y[y >= h] = h - 1
+        user_layer[(y, x)] = 1.
+    return user_layer
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Timing helpers shared by the benchmarks.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import time
+
+
+def best_of(func, n=3):
+    """
+    The shortest of n runs of func(), in seconds.
+    """
+    times = []
+    for _ in range(n):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
@@ -5,10 +5,11 @@
 pickthat
 ==================
 """
-from .api import API
+from .api import API, AsyncAPI
 from .pick import Pick
 
 __all__ = ['API',
+           'AsyncAPI',
            'Pick',
            ]
 
@@ -6,8 +6,21 @@ The Pick This web API interface.
 :copyright: 2015 Agile Geoscience
 :license: Apache 2.0
 """
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import requests
+from requests.adapters import HTTPAdapter
 
+from .cache import ResponseCache
+from .categories import COHORTS, USERS
+from .instrument import Instrumentation
+from .jsonstream import iter_json_array
+from .singleflight import SingleFlight
+from .corpus import Corpus, FetchStats
+from .index import PickIndex, image_key
 from .user import User
 from .pick import Pick
 from .image import Image as Img
@@ -21,44 +34,343 @@ class PickThisAPIError(Exception):
 
 
 class API(object):
+    """
+    A client for the Pick This web API.
+
+    All requests, including image downloads made by the Image objects
+    this client returns, go through one pooled keep-alive session. Use
+    the client as a context manager, or call close(), to release the
+    connections when you're done.
+
+    Args:
+        url (str): The root URL of the service.
+        pool_connections (int): The number of per-host connection pools
+            to keep.
+        pool_maxsize (int): The maximum number of connections to keep
+            open to any one host.
+        keep_alive (bool): Whether to reuse connections between requests.
+        session (requests.Session): Use this session instead of making
+            one. The client will not close a session it did not make,
+            or change its headers.
+        cache (ResponseCache or str): Cache responses on disk, in this
+            cache or in a new one at this path.
+        offline (bool): Only answer from the cache, never touching the
+            network. Requires a cache.
+        raster_cache (RasterCache): Keep the images fetched by
+            Image.image() in this cache.
+        instrument (bool, callable or Instrumentation): Record timings
+            and counts per endpoint. Pass True, a callback to call with
+            each event, or an Instrumentation. Read the totals with
+            instrument.snapshot(). Attempts retried by the limiter are
+            recorded as requests of their own.
+        limiter (AdaptiveLimiter): Throttle requests, and retry them
+            when the server is overloaded.
 
-    def __init__(self, url=None):
+    The images and picks the client fetches are kept in its index, an
+    in-memory PickIndex, so picks and images can be looked up by user.
+
+    Concurrent identical requests, including image downloads, share
+    one fetch. The number of requests saved is in flight.saved.
+    """
+    def __init__(self, url=None,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 keep_alive=True,
+                 session=None,
+                 cache=None,
+                 offline=False,
+                 raster_cache=None,
+                 instrument=None,
+                 limiter=None):
         if url is None:
             self.url = 'http://dev.pick-this.appspot.com/'
         else:
             self.url = url
         self.headers = {"Accept": "application/json"}
 
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections,
+                                  pool_maxsize=pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._owns_session = True
+        else:
+            self._owns_session = False
+
+        # Leave the headers of a caller's session alone; its image
+        # downloads keep whatever it was set up to do.
+        if not keep_alive:
+            if self._owns_session:
+                session.headers['Connection'] = 'close'
+            else:
+                self.headers['Connection'] = 'close'
+
+        self.session = session
+
+        if isinstance(cache, str):
+            cache = ResponseCache(cache)
+        if offline and cache is None:
+            raise ValueError("Offline mode needs a cache.")
+        self.cache = cache
+        self.offline = offline
+        self.raster_cache = raster_cache
+        self.index = PickIndex()
+        self.flight = SingleFlight()
+
+        if instrument is True:
+            instrument = Instrumentation()
+        elif callable(instrument):
+            instrument = Instrumentation(callback=instrument)
+        self.instrument = instrument or None
+        self.limiter = limiter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled connections, if this client made them.
+        """
+        if self._owns_session:
+            self.session.close()
+
     def __api(self, endpoint, params):
         """
         Raw API call.
         """
+        return self.__fetch(endpoint, params)[0]
+
+    def __fetch(self, endpoint, params, revalidate=False, etag=None):
+        """
+        Raw API call, returning the data and its ETag. Identical calls
+        made at the same time from several threads share one request.
+
+        If revalidate is True, a cached response is only used if the
+        server says it has not changed. If etag is given and nothing is
+        cached, the server is asked whether it has changed from that,
+        and if it hasn't the data is None.
+        """
         url = self.url.strip('/') + '/' + endpoint.strip('/')
-        response = requests.get(url, headers=self.headers, params=params)
+        key = (url, tuple(sorted(params.items())), revalidate, etag)
+        return self.flight.do(key, self.__request, url, endpoint, params,
+                              revalidate, etag)
+
+    def __request(self, url, endpoint, params, revalidate=False, etag=None):
+        """
+        Make a request, or answer it from the cache.
+        """
+        headers = dict(self.headers)
+
+        entry = None
+        if self.cache is not None:
+            key = self.cache.key(url, params)
+            entry = self.cache.get(key)
+            if entry is not None:
+                fresh = self.offline or self.cache.is_fresh(entry)
+                if fresh and not revalidate:
+                    return entry['data'], entry.get('etag')
+                headers.update(self.cache.conditional_headers(entry))
+            elif self.offline:
+                raise PickThisAPIError('Not in cache: ' + endpoint)
+        if (entry is None) and (etag is not None):
+            headers['If-None-Match'] = etag
+
+        response, ttfb = self.__send(endpoint, url, headers, params,
+                                     stream=self.instrument is not None)
+        t1 = time.time()
+        content = response.content
+        t2 = time.time()
+
+        data = None
+        if response.status_code == 200:
+            data = response.json()
+
+        if self.instrument is not None:
+            self.instrument.request(endpoint,
+                                    status=response.status_code,
+                                    nbytes=len(content),
+                                    ttfb=ttfb,
+                                    download=t2 - t1,
+                                    decode=time.time() - t2)
+
+        if response.status_code == 304:
+            if entry is not None:
+                return self.cache.refresh(key, entry)['data'], entry.get('etag')
+            if etag is not None:
+                return None, etag
 
         if response.status_code != 200:
-            raise PickThisAPIError('Server error.')
+            raise PickThisAPIError('Server error: {}'.format(response.status_code))
 
-        return response.json()
+        if self.cache is not None:
+            self.cache.put(key, data,
+                           etag=response.headers.get('ETag'),
+                           last_modified=response.headers.get('Last-Modified'))
 
-    def picks(self, image_id=None, user=None):
+        return data, response.headers.get('ETag')
+
+    def __send(self, endpoint, url, headers, params, stream):
+        """
+        Send a request, through the limiter if there is one. Each attempt
+        is timed to its first byte, and any that were retried are
+        recorded.
+
+        Returns:
+            tuple. The response, and the seconds it took to arrive.
+        """
+        attempts = []
+
+        def get():
+            t0 = time.time()
+            response = self.session.get(url, headers=headers, params=params,
+                                        stream=stream)
+            attempts.append((response, time.time() - t0))
+            return response
+
+        if self.limiter is not None:
+            response = self.limiter.call(get)
+        else:
+            response = get()
+
+        if self.instrument is not None:
+            for retried, ttfb in attempts[:-1]:
+                self.instrument.request(endpoint,
+                                        status=retried.status_code,
+                                        nbytes=0,
+                                        ttfb=ttfb,
+                                        download=0.,
+                                        decode=0.)
+        return response, attempts[-1][1]
+
+    def __constructed(self, endpoint, results, t0):
+        """
+        Record the time taken to build objects since t0.
+        """
+        if self.instrument is not None:
+            self.instrument.construct(endpoint, len(results), time.time() - t0)
+
+    def picks(self, image_id=None, user=None, cohort=None):
         """
         Fetch picks belonging to an image or to a user.
+
+        The API can only fetch picks by image. The picks fetched are
+        kept in the client's index, so picks by user or by cohort are
+        looked up there, among the images fetched so far. Call
+        fetch_corpus() first to look among all of them.
         """
         endpoint = "api/picks"
 
         if image_id is not None:
             params = {'image_key': image_id,
                       'all': 1}
+            all_data = self.__api(endpoint, params)
+
+            t0 = time.time()
+            results = []
+            for data in all_data:
+                results.append(Pick(data))
+            self.__constructed(endpoint, results, t0)
+            self.index.add_picks(image_id, results)
+        elif user is not None:
+            results = self.index.picks_for_user(user)
+        elif cohort is not None:
+            results = self.index.picks_for_cohort(cohort)
         else:
             raise NotImplementedError
 
-        all_data = self.__api(endpoint, params)
+        if user is not None:
+            code = USERS.code(user, add=False)
+            results = [p for p in results if getattr(p, 'user_code', None) == code]
+        if cohort is not None:
+            code = COHORTS.code(cohort, add=False)
+            results = [p for p in results if getattr(p, 'cohort_code', None) == code]
+        return results
+
+    def iter_picks(self, image_id, chunk_size=65536):
+        """
+        Fetch the picks belonging to an image, yielding each Pick as
+        soon as it has been downloaded. The response is decoded as it
+        streams in, so the whole payload is never held in memory.
+
+        A usable cached response is served from the cache, but streamed
+        responses are not written to it. Once all of an image's picks
+        have been read, they are added to the client's index.
+
+        Args:
+            image_id (str): The key of the image.
+            chunk_size (int): The number of bytes to read at a time.
+
+        Yields:
+            Pick.
+        """
+        endpoint = "api/picks"
+        params = {'image_key': image_id,
+                  'all': 1}
+        url = self.url.strip('/') + '/' + endpoint.strip('/')
+
+        if self.cache is not None:
+            entry = self.cache.get(self.cache.key(url, params))
+            if entry is not None:
+                if self.offline or self.cache.is_fresh(entry):
+                    results = []
+                    for data in entry['data']:
+                        pick = Pick(data)
+                        results.append(pick)
+                        yield pick
+                    self.index.add_picks(image_id, results)
+                    return
+            elif self.offline:
+                raise PickThisAPIError('Not in cache: ' + endpoint)
+
+        response, ttfb = self.__send(endpoint, url, self.headers, params,
+                                     stream=True)
+
+        # Only the time spent in here counts, not the time the caller
+        # spends between picks. Decoding is whatever isn't reading.
+        timing = {'bytes': 0, 'download': 0., 'decode': 0., 'construct': 0.}
+
+        def chunks():
+            for chunk in timed(response.iter_content(chunk_size), 'download'):
+                timing['bytes'] += len(chunk)
+                yield chunk
+
+        def timed(iterable, key):
+            iterator = iter(iterable)
+            while True:
+                t0 = time.time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    timing[key] += time.time() - t0
+                    return
+                timing[key] += time.time() - t0
+                yield item
 
         results = []
-        for data in all_data:
-            results.append(Pick(data))
-        return results
+        try:
+            if response.status_code != 200:
+                raise PickThisAPIError('Server error: {}'.format(response.status_code))
+            for data in timed(iter_json_array(chunks()), 'decode'):
+                t0 = time.time()
+                pick = Pick(data)
+                timing['construct'] += time.time() - t0
+                results.append(pick)
+                yield pick
+        finally:
+            response.close()
+            if self.instrument is not None:
+                self.instrument.request(endpoint,
+                                        status=response.status_code,
+                                        nbytes=timing['bytes'],
+                                        ttfb=ttfb,
+                                        download=timing['download'],
+                                        decode=timing['decode'] - timing['download'])
+                self.instrument.construct(endpoint, len(results), timing['construct'])
+        self.index.add_picks(image_id, results)
 
     def users(self, user_id=None):
         """
@@ -75,17 +387,30 @@ class API(object):
 
         all_data = self.__api(endpoint, params)
 
+        t0 = time.time()
         results = []
         for data in all_data:
             results.append(User(data))
+        self.__constructed(endpoint, results, t0)
         return results
 
     def images(self, image_id=None, user=None):
         """
         Fetch data about one or all images.
+
+        The images a user has picked on are looked up in the client's
+        index, so only images whose picks have been fetched are found.
         """
         endpoint = "api/images"
 
+        if user is not None:
+            keys = self.index.image_keys_for_user(user)
+            if image_id is not None:
+                keys = [k for k in keys if k == image_id]
+            if any(k not in self.index.images for k in keys):
+                self.images()
+            return [self.index.images[k] for k in keys if k in self.index.images]
+
         params = {}
 
         if image_id is not None:
@@ -93,13 +418,200 @@ class API(object):
         else:
             params['all'] = 1
 
-        if user is not None:
-            raise NotImplementedError
-
         all_data = self.__api(endpoint, params)
 
+        t0 = time.time()
         results = []
         for data in all_data:
-            results.append(Img(data))
+            image = Img(data,
+                        session=self.session,
+                        raster_cache=self.raster_cache,
+                        flight=self.flight)
+            self.index.add_image(image)
+            results.append(image)
+        self.__constructed(endpoint, results, t0)
         return results
 
+    def fetch_corpus(self, max_workers=8, progress=None):
+        """
+        Fetch all the images, users and picks, overlapping the requests
+        on a thread pool. The picks for each image are requested as soon
+        as the image list arrives, alongside the users.
+
+        Args:
+            max_workers (int): The number of requests to run at once.
+            progress (callable): Called with the FetchStats after each
+                request completes.
+
+        Returns:
+            Corpus. The stats of the fetch are in its stats attribute.
+        """
+        corpus = Corpus()
+        stats = FetchStats()
+        stats.expect(2)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {pool.submit(self.images): ('images', None),
+                       pool.submit(self.users): ('users', None),
+                       }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key = pending.pop(future)
+                    results = future.result()
+                    if kind == 'images':
+                        keys = []
+                        for image in results:
+                            corpus.add_image(image)
+                            if image_key(image) is not None:
+                                keys.append(image_key(image))
+                        stats.expect(len(keys))
+                        for k in keys:
+                            f = pool.submit(self.picks, image_id=k)
+                            pending[f] = ('picks', k)
+                    elif kind == 'users':
+                        for user in results:
+                            corpus.add_user(user)
+                    else:
+                        corpus.add_picks(key, results)
+                    stats.record(len(results))
+                    if progress is not None:
+                        progress(stats)
+
+        stats.finish()
+        corpus.stats = stats
+        return corpus
+
+    def sync(self, store, image_ids=None, since=None):
+        """
+        Bring a PickStore up to date, changing only the picks that have
+        changed and marking the images they belong to as stale.
+
+        Args:
+            store (PickStore): The store to update.
+            image_ids (iterable): The keys of the images to sync.
+                Defaults to all the images.
+            since (str): The name of a query parameter the server uses
+                to send only the picks changed after a timestamp. The
+                image's high-water mark is passed in it. If None, all
+                the picks are fetched and compared with the store.
+
+        Every request goes to the server: cached responses are only
+        used if the server says they have not changed. An image whose
+        picks come back with the ETag the store was last updated from
+        is skipped without comparing them.
+
+        Returns:
+            dict. The added, changed and removed picks for each image.
+        """
+        if self.offline:
+            raise PickThisAPIError("Cannot sync in offline mode.")
+
+        if image_ids is None:
+            all_data, _ = self.__fetch("api/images", {'all': 1}, revalidate=True)
+            image_ids = [data.get('id') or data.get('key') for data in all_data]
+
+        results = {}
+        for key in image_ids:
+            params = {'image_key': key,
+                      'all': 1}
+            high_water = store.high_water(key)
+            incremental = (since is not None) and (high_water is not None)
+            if incremental:
+                params[since] = high_water
+            known = store.etag(key)
+            records, etag = self.__fetch("api/picks", params,
+                                         revalidate=True, etag=known)
+            if (known is not None) and (etag == known):
+                results[key] = {'added': [], 'changed': [], 'removed': []}
+                continue
+            results[key] = store.update(key, records,
+                                        complete=not incremental, etag=etag)
+        return results
+
+
+class AsyncAPI(object):
+    """
+    An asyncio client for the Pick This web API.
+
+    The calls are made by a synchronous API client on a pool of worker
+    threads, so many requests can be in flight at once over the same
+    pooled session, and you get back the same Pick, User and Image
+    objects as you would from API.
+
+    Args:
+        url (str): The root URL of the service.
+        concurrency (int): The maximum number of requests in flight.
+        api (API): Use this client instead of making one.
+        **kwargs: Passed to API when making a client.
+    """
+    def __init__(self, url=None, concurrency=8, api=None, **kwargs):
+        if api is None:
+            kwargs.setdefault('pool_maxsize', concurrency)
+            api = API(url, **kwargs)
+            self._owns_api = True
+        else:
+            self._owns_api = False
+        self.api = api
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        # Shutting down waits for the workers, so not on the event loop.
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        """
+        Shut down the worker threads and, if this client made it, the
+        underlying API client.
+        """
+        self._executor.shutdown(wait=True)
+        if self._owns_api:
+            self.api.close()
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def picks(self, image_id=None, user=None, cohort=None):
+        """
+        Fetch picks belonging to an image, a user or a cohort.
+        """
+        return await self._run(self.api.picks, image_id=image_id, user=user,
+                               cohort=cohort)
+
+    async def users(self, user_id=None):
+        """
+        Fetch a user or users.
+        """
+        return await self._run(self.api.users, user_id=user_id)
+
+    async def images(self, image_id=None, user=None):
+        """
+        Fetch data about one or all images.
+        """
+        return await self._run(self.api.images, image_id=image_id, user=user)
+
+    async def gather_picks(self, image_ids, concurrency=None):
+        """
+        Fetch the picks for many images concurrently.
+
+        Args:
+            image_ids (iterable): The keys of the images.
+            concurrency (int): The maximum number of requests in flight.
+                Defaults to the concurrency of the client.
+
+        Returns:
+            list. One list of Picks per image, in the order given.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def fetch(image_id):
+            async with semaphore:
+                return await self.picks(image_id=image_id)
+
+        return await asyncio.gather(*[fetch(i) for i in image_ids])
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A persistent on-disk cache for Pick This API responses.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+
+class ResponseCache(object):
+    """
+    Cache decoded API responses on disk, one JSON file per request.
+
+    Entries are keyed by URL and query parameters. Each one remembers
+    when it was stored and any ETag or Last-Modified header the server
+    sent, so stale entries can be revalidated with a conditional
+    request. When the cache grows beyond max_bytes, the least recently
+    used entries are deleted. The size of the cache is measured when it
+    is opened and kept up to date as entries are written, so the
+    directory is only scanned when something has to be evicted.
+
+    Args:
+        path (str): The directory to keep the cache in. It is made if
+            it does not exist.
+        ttl (float): Seconds an entry stays fresh. None means entries
+            never go stale; 0 means always revalidate.
+        max_bytes (int): The maximum total size of the cache files.
+    """
+    def __init__(self, path, ttl=None, max_bytes=100 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._lock = threading.Lock()
+        self._total = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(url, params=None):
+        """
+        The cache key for a request.
+        """
+        raw = json.dumps([url, sorted((params or {}).items())])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        """
+        Get an entry, or None if there isn't one. Getting an entry
+        marks it as recently used.
+        """
+        fname = self._file(key)
+        try:
+            with open(fname) as f:
+                entry = json.load(f)
+            os.utime(fname, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        """
+        Whether an entry can be used without asking the server.
+        """
+        if self.ttl is None:
+            return True
+        return time.time() - entry['time'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """
+        The headers to revalidate an entry with.
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key, data, etag=None, last_modified=None):
+        """
+        Store some data, then evict old entries if the cache is full.
+        """
+        entry = {'time': time.time(),
+                 'etag': etag,
+                 'last_modified': last_modified,
+                 'data': data,
+                 }
+        self._write(key, entry)
+        self.evict()
+        return entry
+
+    def refresh(self, key, entry):
+        """
+        Mark an entry as fresh again, eg after the server said 304.
+        """
+        entry['time'] = time.time()
+        self._write(key, entry)
+        return entry
+
+    def _write(self, key, entry):
+        # Write to a temporary file then move it into place, so readers
+        # never see a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+            size = f.tell()
+        fname = self._file(key)
+        with self._lock:
+            try:
+                old = os.path.getsize(fname)
+            except OSError:
+                old = 0
+            os.replace(tmp, fname)
+            self._total += size - old
+
+    def _entries(self):
+        """
+        The (mtime, size, filename) of every entry on disk.
+        """
+        entries = []
+        for fname in os.listdir(self.path):
+            if not fname.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, fname))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fname))
+        return entries
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits.
+        """
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+
+            # Start again from what is on disk, in case another process
+            # shares the directory.
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, fname in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.path, fname))
+                except OSError:
+                    pass
+                total -= size
+            self._total = total
+
+    def clear(self):
+        """
+        Delete every entry.
+        """
+        with self._lock:
+            for fname in os.listdir(self.path):
+                if fname.endswith('.json'):
+                    os.remove(os.path.join(self.path, fname))
+            self._total = 0
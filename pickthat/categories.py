@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Categorical encoding of repeated values, like cohorts and user IDs.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import threading
+
+import numpy as np
+
+
+class Categories(object):
+    """
+    A shared dictionary mapping values to small integer codes.
+
+    Each distinct value is stored once, so objects that keep its code
+    instead of their own copy of the value save memory, and can be
+    compared or grouped by code. None always has the code -1.
+    """
+    def __init__(self):
+        self.values = []
+        self._codes = {None: -1}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value, add=True):
+        """
+        The code for a value. Unless add is False, new values are added;
+        otherwise an unknown value gets -2, which matches nothing.
+        """
+        try:
+            return self._codes[value]
+        except KeyError:
+            if not add:
+                return -2
+        with self._lock:
+            if value not in self._codes:
+                # Store the value before publishing its code, so readers
+                # that skip the lock never see a code they can't decode.
+                self.values.append(value)
+                self._codes[value] = len(self.values) - 1
+            return self._codes[value]
+
+    def value(self, code):
+        """
+        The value for a code.
+        """
+        if code < 0:
+            return None
+        return self.values[code]
+
+    def encode(self, values):
+        """
+        The codes for many values, as an int32 array.
+        """
+        return np.array([self.code(v) for v in values], dtype=np.int32)
+
+    def decode(self, codes):
+        """
+        The values for an array of codes, as an object array.
+        """
+        lookup = np.empty(len(self.values) + 1, dtype=object)
+        lookup[:-1] = self.values
+        return lookup[np.asarray(codes)]
+
+
+# The categories shared by every Pick and PickTable.
+COHORTS = Categories()
+USERS = Categories()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+An in-memory collection of Pick This images, users and picks.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import time
+import threading
+
+from .index import PickIndex
+
+
+class FetchStats(object):
+    """
+    Progress and throughput counters for a bulk fetch. Safe to update
+    from several threads.
+    """
+    def __init__(self):
+        self.total = 0
+        self.requests = 0
+        self.objects = 0
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def expect(self, n):
+        with self._lock:
+            self.total += n
+
+    def record(self, n_objects):
+        with self._lock:
+            self.requests += 1
+            self.objects += n_objects
+
+    def finish(self):
+        self.finished = time.time()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def requests_per_second(self):
+        return self.requests / max(self.elapsed, 1e-9)
+
+    @property
+    def objects_per_second(self):
+        return self.objects / max(self.elapsed, 1e-9)
+
+    def as_dict(self):
+        return {'total': self.total,
+                'requests': self.requests,
+                'objects': self.objects,
+                'elapsed': self.elapsed,
+                'requests_per_second': self.requests_per_second,
+                'objects_per_second': self.objects_per_second,
+                }
+
+    def __repr__(self):
+        s = "FetchStats({requests}/{total} requests, {objects} objects, "
+        s += "{elapsed:.2f} s, {requests_per_second:.1f} req/s)"
+        return s.format(**self.as_dict())
+
+
+class Corpus(PickIndex):
+    """
+    Images, users and picks, indexed for lookups by image, user and
+    cohort. Users are de-duplicated on their user_id.
+    """
+    def __init__(self):
+        super(Corpus, self).__init__()
+        self.users = {}
+        self.stats = None
+
+    def __repr__(self):
+        s = "Corpus({} images, {} users, {} picks)"
+        return s.format(len(self.images), len(self.users), len(self))
+
+    def add_user(self, user):
+        self.users.setdefault(user.user_id, user)
@@ -7,49 +7,197 @@ An object to hold a Pick This image.
 :license: Apache 2.0
 """
 import requests
-import json
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
+import numpy as np
 from PIL import Image as PImage
 
 from . import pt
+from .categories import COHORTS
+from .record import Record
+from .table import PickTable
 
 
-class Image(object):
-    def __init__(self, data):
+class Image(Record):
+    __slots__ = ('id',
+                 'key',
+                 'link',
+                 'width',
+                 'height',
+                 'pickstyle',
+                 'title',
+                 'description',
+                 'user_id',
+                 'created',
+                 '_session',
+                 '_raster_cache',
+                 '_flight',
+                 )
+
+    def __init__(self, data, session=None, raster_cache=None, flight=None):
         """
         Just set up as a basic dictionary-style object for now.
 
+        Args:
+            data (dict): The image record from the API.
+            session (requests.Session): A session to fetch the image
+                with, usually the pooled session of an API client.
+            raster_cache (RasterCache): A cache to keep the fetched
+                image in.
+            flight (SingleFlight): Share downloads of the image that are
+                in flight at the same time.
+
+        """
+        super(Image, self).__init__(data)
+        self._session = session
+        self._raster_cache = raster_cache
+        self._flight = flight
+
+    def scale_factor(self, max_size=None):
+        """
+        The factor image(max_size) reduces this image by: the smallest
+        power of 2 that brings both sides within max_size. Pass it to
+        heatmap() to get a heatmap that lines up with the image.
         """
-        self.__dict__ = dict(data)
-        for k, v in data.items():
-            if k and v:
-                setattr(self, k, v)
+        scale = 1
+        if max_size is not None:
+            while max(pt.reduced(self.width, scale),
+                      pt.reduced(self.height, scale)) > max_size:
+                scale *= 2
+        return scale
 
-    def image(self):
+    def _download(self, url):
+        """
+        Fetch the bytes of the image.
+        """
+        get = (self._session or requests).get
+        if self._flight is not None:
+            return self._flight.do(url, lambda: get(url).content)
+        return get(url).content
+
+    def image(self, max_size=None, mode=None):
         """
         Fetch the image as a PIL Image object.
 
-        No parameters.
+        Args:
+            max_size (int): Reduce the image by a power of 2 until
+                neither side exceeds this. JPEGs are decoded directly at
+                1/2, 1/4 or 1/8 scale, which is much faster than
+                decoding the whole raster.
+            mode (str): Convert to this PIL mode, eg 'L'. JPEGs can do
+                this while decoding.
+
+        """
+        scale = self.scale_factor(max_size)
+
+        if self._raster_cache is not None:
+            im = self._raster_cache.get(self.link, self._download)
+        else:
+            im = PImage.open(BytesIO(self._download(self.link)))
 
+        width, height = im.size
+        if (scale > 1) or mode:
+            # Only has an effect before the image is loaded, ie for JPEGs
+            # that have not come from the cache. PIL picks the largest
+            # reduction that fits the floor of the size.
+            im.draft(mode, (max(1, width // scale), max(1, height // scale)))
+
+        # Finish off whatever reduction the decoder didn't do.
+        done = 1
+        while pt.reduced(width, done) > im.width:
+            done *= 2
+        if scale > done:
+            im = im.reduce(scale // done)
+        if mode and (im.mode != mode):
+            im = im.convert(mode)
+        return im
+
+    @staticmethod
+    def fetch_many(images, max_workers=8, max_pixels=100000000, **kwargs):
         """
-        r = requests.get(self.link)
-        return PImage.open(BytesIO(r.content))
+        Fetch and decode many images concurrently, on a thread pool.
+
+        To bound memory, images are only started while the decoded
+        pixels in flight, ie being fetched or waiting to be consumed,
+        stay within max_pixels. An image bigger than that is fetched on
+        its own.
 
-    def heatmap(self, picks, cohort=None):
+        Args:
+            images (iterable): The Images to fetch.
+            max_workers (int): The number of images to fetch at once.
+            max_pixels (int): The most decoded pixels to hold at once.
+            **kwargs: Passed to Image.image(), eg max_size and mode.
+
+        Yields:
+            tuple. Each Image and its PIL Image, as they finish.
+        """
+        max_size = kwargs.get('max_size')
+
+        def pixels(img):
+            scale = img.scale_factor(max_size)
+            return (pt.reduced(getattr(img, 'width', 0), scale) *
+                    pt.reduced(getattr(img, 'height', 0), scale))
+
+        images = iter(images)
+        pending = {}
+        in_flight = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            try:
+                img = next(images, None)
+                while (img is not None) or pending:
+                    while img is not None:
+                        n = pixels(img)
+                        if pending and (in_flight + n > max_pixels):
+                            break
+                        pending[pool.submit(img.image, **kwargs)] = (img, n)
+                        in_flight += n
+                        img = next(images, None)
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        done_img, n = pending.pop(future)
+                        try:
+                            yield done_img, future.result()
+                        finally:
+                            in_flight -= n
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def heatmap(self, picks, cohort=None, scale=1):
         """
         Generate a heatmap for this image from some picks.
 
         TODO: This should probably be part of an Experiment object.
 
+        Args:
+            picks (iterable): The Picks to use, or a PickTable.
+            cohort (str): Only use picks from this cohort.
+            scale (int): Reduce the heatmap by this factor, eg the
+                scale_factor() of a reduced image() to overlay it on.
+
         """
-        layers = []
+        if cohort and isinstance(picks, PickTable):
+            picks = picks.where(cohort=cohort)
+            cohort = None
+
+        code = COHORTS.code(cohort, add=False)
+        heatmap = np.zeros((pt.reduced(self.height, scale),
+                            pt.reduced(self.width, scale)), dtype=int)
         for pick in picks:
-            p = json.dumps(pick.picks)
-            layer, _cohort = pt.create_user_heatmap_layer(self, p, pick.cohort)
-            if (not cohort) or (cohort == _cohort):
-                layers.append(layer)
-        return pt.convert_array_to_image(sum(layers))
+            if cohort:
+                try:
+                    if pick.cohort_code != code:
+                        continue
+                except AttributeError:
+                    if pick.cohort != cohort:
+                        continue
+            window, (top, left), _ = pt.create_user_heatmap_window(
+                self, pick.picks, pick.cohort, scale=scale)
+            bottom, right = top + window.shape[0], left + window.shape[1]
+            heatmap[top:bottom, left:right] += window
+        return pt.convert_array_to_image(heatmap)
 
     def composite(self, picks, cohort=None):
         pass
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A local index of picks, by image, user and cohort.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import threading
+from collections import defaultdict
+
+from .categories import COHORTS, USERS
+
+
+def image_key(image):
+    """
+    The key the API uses for an image, ie its id.
+    """
+    return getattr(image, 'id', None) or getattr(image, 'key', None)
+
+
+def pick_codes(pick):
+    """
+    The user and cohort codes of a pick, encoding them if it only has
+    the values.
+    """
+    try:
+        return pick.user_code, pick.cohort_code
+    except AttributeError:
+        return (USERS.code(getattr(pick, 'user_id', None)),
+                COHORTS.code(getattr(pick, 'cohort', None)))
+
+
+class PickIndex(object):
+    """
+    Images and picks, indexed so that the picks for an image, a user or
+    a cohort can be looked up in time proportional to the result.
+    Users and cohorts are indexed by their codes in USERS and COHORTS.
+
+    The index is built up as data arrives: adding the picks for an
+    image replaces any picks already indexed for it.
+    """
+    def __init__(self):
+        self.images = {}
+        self._by_image = {}
+        self._by_user = defaultdict(dict)
+        self._by_cohort = defaultdict(dict)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return sum(len(picks) for picks in self._by_image.values())
+
+    def add_image(self, image):
+        self.images[image_key(image)] = image
+
+    def add_picks(self, key, picks):
+        """
+        Index the picks for the image with this key.
+        """
+        picks = list(picks)
+        with self._lock:
+            self._remove(key)
+            self._by_image[key] = picks
+            for pick in picks:
+                user_code, cohort_code = pick_codes(pick)
+                self._by_user[user_code].setdefault(key, []).append(pick)
+                self._by_cohort[cohort_code].setdefault(key, []).append(pick)
+
+    def _remove(self, key):
+        for pick in self._by_image.pop(key, []):
+            user_code, cohort_code = pick_codes(pick)
+            for index, code in ((self._by_user, user_code),
+                                (self._by_cohort, cohort_code)):
+                index[code].pop(key, None)
+                if not index[code]:
+                    del index[code]
+
+    @property
+    def picks(self):
+        return [p for picks in self._by_image.values() for p in picks]
+
+    @property
+    def image_keys(self):
+        return list(self._by_image)
+
+    @property
+    def user_ids(self):
+        return sorted(USERS.value(c) for c in self._by_user if c >= 0)
+
+    @property
+    def cohorts(self):
+        return sorted(COHORTS.value(c) for c in self._by_cohort if c >= 0)
+
+    def has_image(self, key):
+        return key in self._by_image
+
+    def picks_for_image(self, key):
+        return list(self._by_image.get(key, []))
+
+    def picks_for_user(self, user_id):
+        with self._lock:
+            found = self._by_user.get(USERS.code(user_id, add=False), {})
+            return [p for picks in found.values() for p in picks]
+
+    def picks_for_cohort(self, cohort):
+        with self._lock:
+            found = self._by_cohort.get(COHORTS.code(cohort, add=False), {})
+            return [p for picks in found.values() for p in picks]
+
+    def image_keys_for_user(self, user_id):
+        return list(self._by_user.get(USERS.code(user_id, add=False), {}))
+
+    def images_for_user(self, user_id):
+        keys = self.image_keys_for_user(user_id)
+        return [self.images[k] for k in keys if k in self.images]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Per-endpoint timing and throughput counters for the API client.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import threading
+from collections import Counter
+
+
+class Instrumentation(object):
+    """
+    Record, for each endpoint, the number of requests, their status
+    codes, the bytes received, and the time spent waiting for the first
+    byte, downloading, decoding JSON and constructing objects.
+
+    Args:
+        callback (callable): Called with the endpoint and a dict
+            describing each event as it is recorded: a request, with
+            'status', 'bytes', 'ttfb', 'download' and 'decode', or the
+            construction of objects, with 'objects' and 'construct'.
+            Times are in seconds.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self._stats:
+            self._stats[endpoint] = {'requests': 0,
+                                     'status': Counter(),
+                                     'bytes': 0,
+                                     'ttfb': 0.0,
+                                     'download': 0.0,
+                                     'decode': 0.0,
+                                     'objects': 0,
+                                     'construct': 0.0,
+                                     }
+        return self._stats[endpoint]
+
+    def request(self, endpoint, status, nbytes, ttfb, download, decode):
+        """
+        Record a request.
+        """
+        event = {'status': status,
+                 'bytes': nbytes,
+                 'ttfb': ttfb,
+                 'download': download,
+                 'decode': decode,
+                 }
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['requests'] += 1
+            stats['status'][status] += 1
+            for k in ('bytes', 'ttfb', 'download', 'decode'):
+                stats[k] += event[k]
+        if self.callback is not None:
+            self.callback(endpoint, event)
+
+    def construct(self, endpoint, objects, seconds):
+        """
+        Record the construction of some objects from a response.
+        """
+        event = {'objects': objects,
+                 'construct': seconds,
+                 }
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['objects'] += objects
+            stats['construct'] += seconds
+        if self.callback is not None:
+            self.callback(endpoint, event)
+
+    def snapshot(self):
+        """
+        The totals so far, as a dict of dicts keyed by endpoint. Times
+        are total seconds; mean_ttfb and mean_download are per request.
+        """
+        with self._lock:
+            snap = {}
+            for endpoint, stats in self._stats.items():
+                s = dict(stats, status=dict(stats['status']))
+                n = max(s['requests'], 1)
+                s['mean_ttfb'] = s['ttfb'] / n
+                s['mean_download'] = s['download'] / n
+                snap[endpoint] = s
+            return snap
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Incremental decoding of JSON arrays, for streaming API responses.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import json
+import codecs
+
+WHITESPACE = ' \t\n\r'
+DELIMITERS = WHITESPACE + ',]'
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """
+    Decode a JSON array from an iterable of chunks of text or bytes,
+    yielding each element as soon as it has arrived in full. Only
+    the current element is ever held in memory as text.
+
+    Args:
+        chunks (iterable): The pieces of the document, eg from
+            requests.Response.iter_content().
+        encoding (str): The encoding of byte chunks.
+
+    Yields:
+        The elements of the array.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    buf = ''
+
+    # What can come next: the opening '[', the first value or ']', a
+    # value after a comma, a comma or ']' after a value, or nothing.
+    state = 'start'
+
+    def chars():
+        for chunk in chunks:
+            if isinstance(chunk, bytes):
+                chunk = text.decode(chunk)
+            if chunk:
+                yield chunk
+        yield None  # Marks the end of the stream.
+
+    for chunk in chars():
+        eof = chunk is None
+        if not eof:
+            buf += chunk
+
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            if pos == len(buf):
+                break
+            char = buf[pos]
+
+            if state == 'start':
+                if char != '[':
+                    raise ValueError("Expected a JSON array.")
+                state = 'first'
+                pos += 1
+                continue
+
+            if state == 'done':
+                raise ValueError("Extra data after the JSON array.")
+
+            if state == 'next':
+                if char == ',':
+                    state = 'value'
+                elif char == ']':
+                    state = 'done'
+                else:
+                    raise ValueError("Expected ',' or ']' in the JSON array.")
+                pos += 1
+                continue
+
+            if (char == ']') and (state == 'first'):
+                state = 'done'
+                pos += 1
+                continue
+            if char in ',]':
+                raise ValueError("Expected a value in the JSON array.")
+
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                break  # Incomplete, wait for more data.
+
+            # A number cut off by the end of the chunk, eg '1.' of '1.5',
+            # might continue in the next one; objects and arrays know
+            # where they end.
+            if not (eof or isinstance(obj, (dict, list))):
+                if (end == len(buf)) or (buf[end] not in DELIMITERS):
+                    break
+
+            yield obj
+            state = 'next'
+            pos = end
+
+        buf = buf[pos:]
+        if eof:
+            break
+
+    if state != 'done':
+        raise ValueError("Truncated JSON array.")
@@ -6,11 +6,115 @@ An object to hold a set of picks.
 :copyright: 2015 Agile Geoscience
 :license: Apache 2.0
 """
+import json
 
+import numpy as np
 
-class Pick(object):
-    def __init__(self, data):
-        self.__dict__ = dict(data)
-        for k, v in data.items():
-            if k and v:
-                setattr(self, k, v)
+from .categories import COHORTS, USERS
+from .record import Record
+
+
+class Pick(Record):
+    """
+    One user's interpretation of an image.
+
+    The coordinates are kept as they came from the API, and only turned
+    into a NumPy array the first time picks is read, so code that only
+    needs the other fields never pays for decoding them. Once decoded,
+    only the array is kept.
+
+    The user_id and cohort are stored as codes in the shared USERS and
+    COHORTS categories, in user_code and cohort_code.
+    """
+    __slots__ = ('user_code',
+                 'cohort_code',
+                 'image_key',
+                 'created',
+                 'updated',
+                 '_raw',
+                 '_picks',
+                 )
+
+    @property
+    def user_id(self):
+        return USERS.value(self.user_code)
+
+    @user_id.setter
+    def user_id(self, value):
+        self.user_code = USERS.code(value)
+
+    @property
+    def cohort(self):
+        return COHORTS.value(self.cohort_code)
+
+    @cohort.setter
+    def cohort(self, value):
+        self.cohort_code = COHORTS.code(value)
+
+    @property
+    def picks(self):
+        """
+        The coordinates, as an array of (x, y) or (x, y, group) rows.
+        """
+        try:
+            return self._picks
+        except AttributeError:
+            pass
+        try:
+            raw = self._raw
+        except AttributeError:
+            # Another thread decoded them in the meantime.
+            return self._picks
+        if isinstance(raw, (str, bytes)):
+            raw = json.loads(raw)
+        picks = np.asarray(raw)
+        self._picks = picks
+        try:
+            del self._raw
+        except AttributeError:
+            pass
+        return picks
+
+    @picks.setter
+    def picks(self, value):
+        self._raw = value
+        try:
+            del self._picks
+        except AttributeError:
+            pass
+
+    def __getstate__(self):
+        """
+        The codes only mean something in this process, so pickle the
+        user_id and cohort they stand for instead.
+        """
+        state = dict(getattr(self, '__dict__', {}))
+        for name in self.__slots__:
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        if 'user_code' in state:
+            state['user_id'] = USERS.value(state.pop('user_code'))
+        if 'cohort_code' in state:
+            state['cohort'] = COHORTS.value(state.pop('cohort_code'))
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    def as_dict(self):
+        d = super(Pick, self).as_dict()
+        if 'user_code' in d:
+            d['user_id'] = USERS.value(d.pop('user_code'))
+        if 'cohort_code' in d:
+            d['cohort'] = COHORTS.value(d.pop('cohort_code'))
+        try:
+            d['picks'] = self._raw
+        except AttributeError:
+            try:
+                d['picks'] = self._picks.tolist()
+            except AttributeError:
+                pass
+        return d
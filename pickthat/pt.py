@@ -8,12 +8,17 @@ Various functions for heatmaps and other Pick This tricks.
 """
 import numpy as np
 import json
-import itertools
 from io import StringIO
 
 # For image manipulation
 from PIL import Image
-from mmorph import dilate, sedisk
+from .mmorph import dilate, sedisk
+
+# Optional, for fast dilation of heatmap layers.
+try:
+    from scipy.ndimage import distance_transform_edt
+except ImportError:
+    distance_transform_edt = None
 
 
 def interpolate(x_in, y_in):
@@ -38,6 +43,25 @@ def interpolate(x_in, y_in):
     return x_out.astype(int), y_out.astype(int)
 
 
+def reduced(n, scale):
+    """
+    The length of a side of n pixels after reducing it by a factor of
+    scale, the way PIL does it.
+    """
+    return -(-int(n) // int(scale))
+
+
+class ReducedImage(object):
+    """
+    The geometry of an image reduced by some factor, to draw heatmap
+    layers at that resolution.
+    """
+    def __init__(self, img_obj, scale):
+        self.width = reduced(img_obj.width, scale)
+        self.height = reduced(img_obj.height, scale)
+        self.pickstyle = img_obj.pickstyle
+
+
 def normalize(a, newmax):
     """
     Normalize the values of an
@@ -49,68 +73,146 @@ def normalize(a, newmax):
     return normed
 
 
-def draw_pick_to_user_layer(user_layer, picks, img_obj):
+def segment_pixels(x0, y0, x1, y1):
     """
-    This is where the magic happens.
+    Rasterize many line segments at once.
+
+    Gives the same pixels as running interpolate() on each segment's
+    sorted coordinates and unreversing the result, but for all the
+    segments in one go: each segment is stepped along its longer axis
+    the way np.arange does it, and the other coordinate is interpolated
+    the way np.interp does it.
+
+    Args:
+        x0, y0, x1, y1 (ndarray): The ends of the segments.
+
+    Returns:
+        tuple. The x and y of the pixels, as int arrays.
+    """
+    x0, y0, x1, y1 = [np.asarray(a, dtype=np.float64) for a in (x0, y0, x1, y1)]
+    xlo, xhi = np.minimum(x0, x1), np.maximum(x0, x1)
+    ylo, yhi = np.minimum(y0, y1), np.maximum(y0, y1)
+
+    # The number of pixels is the length of the longer np.arange().
+    nx = np.ceil(xhi + 1 - xlo).astype(int)
+    ny = np.ceil(yhi + 1 - ylo).astype(int)
+    along_x = nx >= ny
+    n = np.where(along_x, nx, ny)
+
+    # Per segment: the long axis steps by one pixel from a_lo, the short
+    # one is interpolated from b_lo to b_hi. Each axis is unreversed if
+    # its coordinates were given in descending order.
+    a_lo = np.where(along_x, xlo, ylo)
+    a_hi = np.where(along_x, xhi, yhi)
+    b_lo = np.where(along_x, ylo, xlo)
+    b_hi = np.where(along_x, yhi, xhi)
+    a_rev = np.where(along_x, x0 > x1, y0 > y1)
+    b_rev = np.where(along_x, y0 > y1, x0 > x1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (b_hi - b_lo) / (a_hi - a_lo)
+
+    # np.arange steps by the difference of its first two values, which
+    # is not exactly 1 for fractional coordinates.
+    step = (a_lo + 1) - a_lo
+
+    # Spread the per-segment values over the pixels.
+    def spread(v):
+        return np.repeat(v, n)
+
+    k = np.arange(n.sum()) - spread(np.cumsum(n) - n)
+    k_rev = spread(n - 1) - k
+    a_lo, a_hi, b_lo, b_hi = spread(a_lo), spread(a_hi), spread(b_lo), spread(b_hi)
+    step = spread(step)
+
+    stepped = a_lo + np.where(spread(a_rev), k_rev, k) * step
+
+    # The short axis, as np.interp would give it at a.
+    a = a_lo + np.where(spread(b_rev), k_rev, k) * step
+    with np.errstate(invalid='ignore'):
+        short = spread(slope) * (a - a_lo) + b_lo
+    short[a == a_lo] = b_lo[a == a_lo]
+    short[a >= a_hi] = b_hi[a >= a_hi]
+
+    ax = spread(along_x)
+    x = np.where(ax, stepped, short)
+    y = np.where(ax, short, stepped)
+    return x.astype(int), y.astype(int)
+
+
+def pick_pixels(picks, img_obj, offsets=None):
+    """
+    The pixels an interpretation covers, as x and y index arrays.
+
+    If offsets are given, picks holds several features, eg separate line
+    segments, with feature i in picks[offsets[i]:offsets[i+1]]. They are
+    rasterized in one batch, without joining one feature to the next.
     """
     w = img_obj.width
     h = img_obj.height
     pickstyle = img_obj.pickstyle
 
-    if pickstyle == 'polygons':
-        agg = np.append(picks, picks[0])
-        picks = agg.reshape(picks.shape[0]+1, picks.shape[1])
-
     # Deal with the points
     if pickstyle != 'points':
-        for i, _ in enumerate(picks[:-1]):
+        if offsets is None:
+            offsets = [0, len(picks)]
+        offsets = np.asarray(offsets)
+        lengths = np.diff(offsets)
 
-            xpair = picks[i:i+2, 0]
+        # Join consecutive points within the same feature.
+        feature = np.repeat(np.arange(lengths.size), lengths)
+        same = feature[:-1] == feature[1:]
+        start, end = picks[:-1][same], picks[1:][same]
 
-            if xpair[0] > xpair[1]:
-                xpair = xpair[xpair[:].argsort()]
-                xrev = True
-            else:
-                xrev = False
+        if pickstyle == 'polygons':
+            # Close each polygon, from its last point to its first.
+            first = offsets[:-1][lengths > 0]
+            last = offsets[1:][lengths > 0] - 1
+            start = np.concatenate([start, picks[last]])
+            end = np.concatenate([end, picks[first]])
 
-            ypair = picks[i:i+2, 1]
+        x, y = segment_pixels(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
 
-            if ypair[0] > ypair[1]:
-                ypair = ypair[ypair[:].argsort()]
-                yrev = True
-            else:
-                yrev = False
+        # Account for pixels at the edge, which have the wrong indices.
+        x[x >= w] = w - 1
+        y[y >= h] = h - 1
 
-            # Do the interpolation
-            x, y = interpolate(xpair, ypair)
+    else:
+        x, y = picks[:, 0], picks[:, 1]
 
-            if xrev:  # then need to unreverse...
-                x = x[::-1]
-            if yrev:  # then need to unreverse...
-                y = y[::-1]
+    return x, y
 
-            # Build up the image, accounting for pixels at
-            # the edge, which have the wrong indices.
-            x[x >= w] = w - 1
-            y[y >= h] = h - 1
-            user_layer[(y, x)] = 1.
 
-    else:
-        x, y = picks[:, 0], picks[:, 1]
-        user_layer[(y, x)] = 1.
+def draw_pick_to_user_layer(user_layer, picks, img_obj, offsets=None):
+    """
+    This is where the magic happens.
 
+    See pick_pixels() for offsets.
+    """
+    x, y = pick_pixels(picks, img_obj, offsets)
+    user_layer[(y, x)] = 1.
     return user_layer
 
 
-def draw_all_picks_to_user_layer(user_layer, all_picks, img_obj):
+def group_picks(all_picks):
+    """
+    Sort picks tagged with their group, and find the offsets of the
+    groups. Untagged picks are one feature, with no offsets.
+    """
     if all_picks[0].size == 3:
         # picks are tagged with their group
         # group indicates the feature, eg the line segment
-        for group in itertools.groupby(all_picks, lambda x: x[2]):
-            picks = np.array([p for p in group[1]])
-            return draw_pick_to_user_layer(user_layer, picks, img_obj)
+        order = np.argsort(all_picks[:, 2], kind='stable')
+        picks = all_picks[order]
+        breaks = np.flatnonzero(np.diff(picks[:, 2])) + 1
+        offsets = np.concatenate([[0], breaks, [len(picks)]])
+        return picks, offsets
     else:
-        return draw_pick_to_user_layer(user_layer, all_picks, img_obj)
+        return all_picks, None
+
+
+def draw_all_picks_to_user_layer(user_layer, all_picks, img_obj):
+    picks, offsets = group_picks(all_picks)
+    return draw_pick_to_user_layer(user_layer, picks, img_obj, offsets)
 
 
 def calculate_disk_radius(img_obj):
@@ -124,24 +226,174 @@ def calculate_disk_radius(img_obj):
     return n
 
 
-def create_user_heatmap_layer(img_obj, picks, cohort):
+# Stamp disks rather than transform the whole layer if the stamps,
+# overlaps and all, would cover less than this many times the image.
+# Stamping takes about as long as the transform at 3.
+SPARSE_DENSITY = 2
+
+# The most stamped pixels to hold in memory at once.
+SPARSE_CHUNK = 2**22
+
+
+def disk_offsets(r):
+    """
+    The (row, column) offsets of the pixels of sedisk(r=r).
+    """
+    dy, dx = np.nonzero(sedisk(r=r))
+    return dy - r, dx - r
+
+
+def stamp_disks(f, r):
+    """
+    Dilate a 0/1 layer by stamping sedisk(r=r) around each set pixel.
+
+    The cost is the number of set pixels times the area of the disk,
+    whatever the size of the layer.
+    """
+    h, w = f.shape
+    out = np.zeros_like(f)
+    flat = out.reshape(-1)
+    y, x = np.nonzero(f)
+    dy, dx = disk_offsets(r)
+    step = max(1, SPARSE_CHUNK // dy.size)
+    for i in range(0, y.size, step):
+        yy = y[i:i+step, None] + dy
+        xx = x[i:i+step, None] + dx
+        inside = (yy >= 0) & (yy < h) & (xx >= 0) & (xx < w)
+        flat[yy[inside] * w + xx[inside]] = 1
+    return out
+
+
+def dilate_disk(f, r, method='auto'):
+    """
+    Dilate a binary layer by sedisk(r=r).
+
+    The 'dense' method is mmorph's dilate(), which takes the maximum of
+    the whole image shifted by every pixel of the disk, so its cost
+    grows with r squared. The 'edt' method thresholds the exact
+    Euclidean distance to the nearest set pixel at r + 0.5, the same
+    test sedisk() makes, so it gives identical pixels in one pass
+    whatever the radius. It needs scipy. The 'sparse' method stamps
+    the disk around each set pixel, so it only costs in proportion to
+    the picks.
+
+    'auto' stamps 0/1 layers whose stamps would cover less than
+    SPARSE_DENSITY times the image, or any 0/1 layer without scipy,
+    uses 'edt' for the rest, and dilate() for anything else.
+
+    Args:
+        f (ndarray): The layer.
+        r (int): The radius of the disk.
+        method (str): 'auto', 'sparse', 'edt' or 'dense'.
+
+    Returns:
+        ndarray. The dilated layer, with the same dtype as f.
+    """
+    if method == 'auto':
+        if np.any((f != 0) & (f != 1)):
+            method = 'dense'
+        elif distance_transform_edt is None:
+            method = 'sparse'
+        else:
+            stamped = np.count_nonzero(f) * disk_offsets(r)[0].size
+            sparse = stamped < SPARSE_DENSITY * f.size
+            method = 'sparse' if sparse else 'edt'
+
+    if method == 'dense':
+        return dilate(f, B=sedisk(r=r))
+
+    if method == 'sparse':
+        return stamp_disks(f, r)
+
+    if method != 'edt':
+        raise ValueError("method must be 'auto', 'sparse', 'edt' or 'dense'")
+    if distance_transform_edt is None:
+        raise ImportError("the 'edt' method needs scipy")
+    if not np.any(f):
+        return np.zeros_like(f)
+    distance = distance_transform_edt(f == 0)
+    return (distance <= r + 0.5).astype(f.dtype)
+
+
+def as_pick_array(picks):
+    """
+    Get the coordinates of an interpretation as an array, from a Pick,
+    an array, a sequence of rows, or a JSON string.
+    """
+    if hasattr(picks, 'picks'):
+        picks = picks.picks
+    if isinstance(picks, (str, bytes)):
+        picks = json.loads(picks)
+    return np.asarray(picks)
+
+
+def create_user_heatmap_window(img_obj, picks, cohort, scale=1):
+    """
+    Draw and dilate one user's interpretation, only in the part of the
+    image it covers: the bounding box of its pixels, grown by the
+    radius of the disk and clipped to the image.
+
+    Takes the same arguments as create_user_heatmap_layer().
+
+    Returns:
+        tuple. The window, the (row, column) of its top left corner in
+            the image, and the cohort.
+    """
+    if scale > 1:
+        img_obj = ReducedImage(img_obj, scale)
+
     w = img_obj.width
     h = img_obj.height
 
-    # Make a new image for this interpretation.
-    user_layer = np.zeros((h, w), dtype=np.float32)
-
     # Get the points.
-    all_picks = np.array(json.loads(picks))
+    all_picks = as_pick_array(picks)
 
     if all_picks.size == 0:
         raise Exception
 
-    user_layer = draw_all_picks_to_user_layer(user_layer, all_picks, img_obj)
+    if scale > 1:
+        all_picks = all_picks.copy()
+        all_picks[:, :2] //= scale
+
+    picks, offsets = group_picks(all_picks)
+    x, y = pick_pixels(picks, img_obj, offsets)
     n = calculate_disk_radius(img_obj)
 
+    if x.size == 0:
+        return np.zeros((0, 0), dtype=int), (0, 0), cohort
+
+    # Index like numpy would in the whole layer, wrapping negative
+    # indices and raising IndexError for the rest.
+    x, y = np.arange(w)[x], np.arange(h)[y]
+
+    top, left = max(y.min() - n, 0), max(x.min() - n, 0)
+    bottom, right = min(y.max() + n + 1, h), min(x.max() + n + 1, w)
+
+    # Make a new image for this interpretation.
+    window = np.zeros((bottom - top, right - left), dtype=int)
+    window[y - top, x - left] = 1
+
     # Dilate this image.
-    return dilate(user_layer.astype(int), B=sedisk(r=n)), cohort
+    return dilate_disk(window, n), (top, left), cohort
+
+
+def create_user_heatmap_layer(img_obj, picks, cohort, scale=1):
+    """
+    Draw and dilate one user's interpretation.
+
+    picks can be a Pick, an array or sequence of (x, y) or (x, y, group)
+    rows, or, as before, a JSON string of them.
+    """
+    window, (top, left), cohort = create_user_heatmap_window(img_obj,
+                                                             picks,
+                                                             cohort,
+                                                             scale=scale)
+    h = reduced(img_obj.height, scale)
+    w = reduced(img_obj.width, scale)
+    user_layer = np.zeros((h, w), dtype=window.dtype)
+    bottom, right = top + window.shape[0], left + window.shape[1]
+    user_layer[top:bottom, left:right] = window
+    return user_layer, cohort
 
 
 def convert_array_to_image(the_array):
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A two-level cache for Pick This image rasters.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+from PIL import Image as PImage
+
+# Bytes per pixel, for the modes we can store raw.
+PIXEL_BYTES = {'1': 1, 'L': 1, 'LA': 2, 'RGB': 3, 'RGBA': 4,
+               'CMYK': 4, 'I': 4, 'F': 4,
+               }
+
+
+def nbytes(im):
+    """
+    The approximate size in memory of a PIL image's pixels.
+    """
+    return im.width * im.height * PIXEL_BYTES.get(im.mode, 4)
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class RasterCache(object):
+    """
+    Keep decoded images in memory, and optionally on disk.
+
+    The memory level is an LRU of decoded PIL images, bounded by the
+    size of their pixels. The disk level maps each URL to the SHA-1 of
+    its content, so identical images are stored once. If raw is True,
+    the decoded pixels are kept alongside the encoded file where the
+    mode allows it, so a disk hit skips both the download and the
+    decoding, at the cost of many times the space. When the disk level
+    grows beyond max_disk_bytes, the least recently used files are
+    deleted.
+
+    Args:
+        max_bytes (int): The maximum size of the decoded images kept in
+            memory.
+        path (str): The directory for the disk level, or None for
+            memory only. It is made if it does not exist.
+        max_disk_bytes (int): The maximum total size of the files on
+            disk.
+        raw (bool): Also keep the decoded pixels on disk.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024, path=None,
+                 max_disk_bytes=1024 * 1024 * 1024, raw=False):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.raw = raw
+        self.nbytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_total = 0
+        if path is not None:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self._disk_total = sum(size for _, size, _ in self._entries())
+
+    def get(self, url, fetch):
+        """
+        Get the image at a URL, fetching it only if it's not cached.
+
+        Args:
+            url (str): The URL of the image.
+            fetch (callable): Given the URL, returns the encoded image
+                as bytes.
+
+        Returns:
+            PIL.Image. A copy, so it's safe to modify.
+        """
+        with self._lock:
+            im = self._images.get(url)
+            if im is not None:
+                self._images.move_to_end(url)
+                return im.copy()
+
+        im = self._load(url)
+        if im is None:
+            data = fetch(url)
+            im = PImage.open(BytesIO(data))
+            im.load()
+            self._store(url, data, im)
+
+        self._remember(url, im)
+        return im.copy()
+
+    def _remember(self, url, im):
+        size = nbytes(im)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if url in self._images:
+                return
+            self._images[url] = im
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, old = self._images.popitem(last=False)
+                self.nbytes -= nbytes(old)
+
+    def clear(self):
+        """
+        Forget the images in memory. The disk level is kept.
+        """
+        with self._lock:
+            self._images.clear()
+            self.nbytes = 0
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write(self, name, data):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        fname = self._file(name)
+        with self._disk_lock:
+            try:
+                old = os.path.getsize(fname)
+            except OSError:
+                old = 0
+            os.replace(tmp, fname)
+            self._disk_total += len(data) - old
+
+    def _read(self, name, mode='rb'):
+        """
+        Read a file, marking it as recently used.
+        """
+        fname = self._file(name)
+        with open(fname, mode) as f:
+            data = f.read()
+        try:
+            os.utime(fname, None)
+        except OSError:
+            pass
+        return data
+
+    def _entries(self):
+        """
+        The (mtime, size, filename) of every file on disk.
+        """
+        entries = []
+        for fname in os.listdir(self.path):
+            if fname.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(self._file(fname))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fname))
+        return entries
+
+    def evict(self):
+        """
+        Delete least recently used files until the disk level fits.
+        """
+        if self.path is None:
+            return
+        with self._disk_lock:
+            if self._disk_total <= self.max_disk_bytes:
+                return
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, fname in sorted(entries):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(self._file(fname))
+                except OSError:
+                    pass
+                total -= size
+            self._disk_total = total
+
+    def _load(self, url):
+        """
+        Get an image from disk, or None.
+        """
+        if self.path is None:
+            return None
+        try:
+            digest = self._read(_sha1(url.encode('utf-8')) + '.url', 'r').strip()
+        except (IOError, OSError):
+            return None
+
+        # Prefer the raw pixels, which need no decoding.
+        try:
+            meta = json.loads(self._read(digest + '.json', 'r'))
+            pixels = self._read(digest + '.px')
+            return PImage.frombytes(meta['mode'], tuple(meta['size']), pixels)
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        try:
+            im = PImage.open(BytesIO(self._read(digest + '.img')))
+            im.load()
+            return im
+        except (IOError, OSError):
+            return None
+
+    def _store(self, url, data, im):
+        if self.path is None:
+            return
+        digest = _sha1(data)
+        if not os.path.exists(self._file(digest + '.img')):
+            self._write(digest + '.img', data)
+            if self.raw and (im.mode in PIXEL_BYTES):
+                self._write(digest + '.px', im.tobytes())
+                meta = {'mode': im.mode, 'size': list(im.size)}
+                self._write(digest + '.json', json.dumps(meta).encode('utf-8'))
+        self._write(_sha1(url.encode('utf-8')) + '.url', digest.encode('utf-8'))
+        self.evict()
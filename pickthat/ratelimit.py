@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Adaptive rate limiting for bulk crawls of the Pick This API.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import time
+import random
+import threading
+from email.utils import parsedate_tz, mktime_tz
+
+import requests
+
+# Status codes that mean the server is overloaded or failing.
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Errors that mean the request never got a response.
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+def retry_after(value):
+    """
+    Seconds to wait according to a Retry-After header, or None. The
+    header holds either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0., mktime_tz(parsed) - time.time())
+
+
+class AdaptiveLimiter(object):
+    """
+    A token bucket rate limiter with an AIMD concurrency window.
+
+    Requests take a token from a bucket refilled at rate per second,
+    and a slot in a window of concurrent requests. Each success grows
+    the window additively, by one slot per window of successes; each
+    429 or 5xx, connection error or timeout halves it. Failed requests
+    are retried with full-jitter exponential backoff, or after the
+    server's Retry-After.
+
+    Args:
+        rate (float): Requests per second. None for no rate limit.
+        burst (int): The size of the token bucket.
+        window (int): The starting number of concurrent requests.
+        min_window (int): The smallest the window can shrink to.
+        max_window (int): The largest the window can grow to.
+        retries (int): How many times to retry a failed request.
+        backoff (float): The base backoff time in seconds.
+        max_backoff (float): The longest time to wait before a retry.
+    """
+    def __init__(self, rate=None, burst=10, window=4,
+                 min_window=1, max_window=32,
+                 retries=5, backoff=0.5, max_backoff=30.):
+        self.rate = rate
+        self.burst = burst
+        self.window = float(window)
+        self.min_window = min_window
+        self.max_window = max_window
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self._tokens = float(burst)
+        self._last = time.time()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.time()
+        if self.rate is not None:
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """
+        Wait for a token and a slot in the window.
+        """
+        with self._cond:
+            while True:
+                self._refill()
+                has_token = (self.rate is None) or (self._tokens >= 1)
+                if has_token and (self.in_flight < int(self.window)):
+                    break
+                if not has_token:
+                    self._cond.wait((1 - self._tokens) / self.rate)
+                else:
+                    self._cond.wait()
+            if self.rate is not None:
+                self._tokens -= 1
+            self.in_flight += 1
+
+    def release(self, status):
+        """
+        Free the slot, and adjust the window to the status code. A
+        status of None means the request failed outright.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if (status is None) or (status in RETRY_STATUS):
+                self.throttled += 1
+                self.window = max(self.min_window, self.window / 2.)
+            else:
+                self.successes += 1
+                self.window = min(self.max_window, self.window + 1. / self.window)
+            self._cond.notify_all()
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before retry number attempt (from 0).
+        """
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after)
+        cap = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, cap)
+
+    def call(self, func):
+        """
+        Call func(), which makes a request and returns the response,
+        under the limiter, retrying on 429 and 5xx responses, connection
+        errors and timeouts. Once the retries run out, the last response
+        is returned or the last error raised.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            status = None
+            try:
+                response = func()
+                status = response.status_code
+            except RETRY_ERRORS:
+                if attempt >= self.retries:
+                    raise
+                wait = None
+            else:
+                if (status not in RETRY_STATUS) or (attempt >= self.retries):
+                    return response
+                wait = retry_after(response.headers.get('Retry-After'))
+                response.close()
+            finally:
+                self.release(status)
+
+            time.sleep(self.delay(attempt, wait))
+            attempt += 1
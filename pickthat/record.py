@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A compact base class for the objects made from API records.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+
+
+class Record(object):
+    """
+    An object whose attributes are the keys of a dict from the API.
+
+    Subclasses list the fields they expect in __slots__, which are
+    stored compactly. Any other keys go in the instance __dict__, which
+    is only made if there are some.
+    """
+    __slots__ = ('__dict__',)
+
+    def __init__(self, data):
+        for k, v in data.items():
+            if k:
+                setattr(self, k, v)
+
+    @classmethod
+    def fields(cls):
+        """
+        The names of the schema fields, ie the slots, of this class.
+        """
+        names = []
+        for klass in reversed(cls.__mro__):
+            for name in getattr(klass, '__slots__', ()):
+                if not name.startswith('_'):
+                    names.append(name)
+        return names
+
+    def as_dict(self):
+        """
+        The record as a dict, as it came from the API.
+        """
+        d = {}
+        for name in self.fields():
+            try:
+                d[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        d.update(getattr(self, '__dict__', {}))
+        return d
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Save and load a fetched corpus as one compact binary snapshot.
+
+A snapshot is an uncompressed NumPy .npz file. The pick coordinates of
+every interpretation are stacked into one int32 array of (x, y, group)
+rows, with CSR-style offsets saying where each interpretation starts.
+Everything else goes in a small JSON header.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import json
+import struct
+import zipfile
+
+import numpy as np
+
+from .corpus import Corpus
+from .image import Image
+from .pick import Pick
+from .table import pack_coords
+from .user import User
+
+VERSION = 1
+
+
+def save_snapshot(path, corpus):
+    """
+    Write a Corpus to a snapshot file.
+
+    Args:
+        path (str): The file to write.
+        corpus (Corpus): The images, users and picks to save.
+    """
+    meta, all_picks = [], []
+    for key, image in corpus.images.items():
+        for pick in corpus.picks_for_image(key):
+            record = pick.as_dict()
+            all_picks.append(record.pop('picks', []))
+            record['_image'] = key
+            meta.append(record)
+    coords, offsets, ncols = pack_coords(all_picks)
+
+    header = {'version': VERSION,
+              'images': [image.as_dict() for image in corpus.images.values()],
+              'users': [user.as_dict() for user in corpus.users.values()],
+              'picks': meta,
+              }
+    header = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+
+    np.savez(path,
+             header=header,
+             coords=coords,
+             offsets=offsets,
+             ncols=ncols)
+
+
+def _memmap(path, name):
+    """
+    Memory-map an array stored uncompressed in an .npz file.
+    """
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(path, 'rb') as f:
+        # Skip the zip local file header to get to the .npy file.
+        f.seek(info.header_offset)
+        local = f.read(30)
+        name_len, extra_len = struct.unpack('<HH', local[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if not shape or not np.prod(shape):
+        return np.zeros(shape, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset,
+                     shape=shape, order='F' if fortran else 'C')
+
+
+def load_snapshot(path, mmap=True):
+    """
+    Read a snapshot file into a Corpus.
+
+    Args:
+        path (str): The file to read.
+        mmap (bool): Memory-map the pick coordinates instead of reading
+            them. Each pick's coordinates are then a read-only view.
+
+    Returns:
+        Corpus.
+    """
+    with np.load(path) as npz:
+        header = json.loads(npz['header'].tobytes().decode('utf-8'))
+        offsets = npz['offsets']
+        ncols = npz['ncols']
+        coords = None if mmap else npz['coords']
+
+    if header['version'] != VERSION:
+        raise ValueError("Unknown snapshot version.")
+
+    if coords is None:
+        coords = _memmap(path, 'coords')
+
+    corpus = Corpus()
+    for data in header['images']:
+        corpus.add_image(Image(data))
+    for data in header['users']:
+        corpus.add_user(User(data))
+
+    by_image = {}
+    for i, data in enumerate(header['picks']):
+        key = data.pop('_image')
+        pick = Pick(data)
+        pick.picks = coords[offsets[i]:offsets[i+1], :ncols[i]]
+        by_image.setdefault(key, []).append(pick)
+    for key, picks in by_image.items():
+        corpus.add_picks(key, picks)
+
+    return corpus
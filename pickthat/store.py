@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A local SQLite store of picks, for incremental syncing.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import json
+import time
+import sqlite3
+import hashlib
+
+from .pick import Pick
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS picks (
+    image_key TEXT NOT NULL,
+    pick_key TEXT NOT NULL,
+    user_id TEXT,
+    cohort TEXT,
+    digest TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (image_key, pick_key)
+);
+CREATE TABLE IF NOT EXISTS images (
+    image_key TEXT PRIMARY KEY,
+    high_water TEXT,
+    synced REAL,
+    stale INTEGER NOT NULL DEFAULT 0,
+    etag TEXT
+);
+"""
+
+
+def digest(data):
+    """
+    A fingerprint of a pick record, to tell if it has changed.
+    """
+    raw = json.dumps(data, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class PickStore(object):
+    """
+    Picks kept in a SQLite database, with a high-water mark and a stale
+    flag per image. Each user has one interpretation per image, so picks
+    are identified by image and user.
+
+    Args:
+        path (str): The database file, or ':memory:'.
+        timestamp (str): The field of a pick record that says when it
+            last changed. Its largest value for an image is kept as the
+            image's high-water mark, compared and stored as whatever
+            type it has, eg a string or a number.
+    """
+    def __init__(self, path=':memory:', timestamp='updated'):
+        self.path = path
+        self.timestamp = timestamp
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+        # Stores made before images had an etag.
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(images)")]
+        if 'etag' not in columns:
+            with self.db:
+                self.db.execute("ALTER TABLE images ADD COLUMN etag TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def pick_key(data):
+        return data.get('user_id') or digest(data)
+
+    def high_water(self, image_key):
+        """
+        The latest timestamp seen in the picks for an image, or None.
+        """
+        row = self.db.execute("SELECT high_water FROM images WHERE image_key = ?",
+                              (image_key,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return row[0]  # Stored as plain text by older versions.
+
+    def etag(self, image_key):
+        """
+        The ETag of the response the picks for an image were last
+        updated from, or None.
+        """
+        row = self.db.execute("SELECT etag FROM images WHERE image_key = ?",
+                              (image_key,)).fetchone()
+        return row[0] if row else None
+
+    def update(self, image_key, records, complete=True, etag=None):
+        """
+        Merge freshly fetched pick records for an image into the store.
+
+        Args:
+            image_key (str): The image the picks belong to.
+            records (list): The pick records, as dicts.
+            complete (bool): Whether the records are all the picks for
+                the image, in which case picks not among them are
+                removed. If the server only sent changes, pass False.
+            etag (str): The ETag of the response the records came from.
+
+        Returns:
+            dict. Lists of the keys of the picks added, changed and
+                removed.
+        """
+        old = dict(self.db.execute("SELECT pick_key, digest FROM picks WHERE image_key = ?",
+                                   (image_key,)))
+        changes = {'added': [], 'changed': [], 'removed': []}
+
+        high_water = self.high_water(image_key)
+        seen = set()
+        with self.db:
+            for data in records:
+                key = self.pick_key(data)
+                seen.add(key)
+                d = digest(data)
+                if old.get(key) == d:
+                    continue
+                changes['changed' if key in old else 'added'].append(key)
+                self.db.execute("INSERT OR REPLACE INTO picks VALUES (?, ?, ?, ?, ?, ?)",
+                                (image_key, key, data.get('user_id'),
+                                 data.get('cohort'), d, json.dumps(data)))
+
+            if complete:
+                for key in set(old) - seen:
+                    changes['removed'].append(key)
+                    self.db.execute("DELETE FROM picks WHERE image_key = ? AND pick_key = ?",
+                                    (image_key, key))
+
+            stamps = [data[self.timestamp] for data in records
+                      if data.get(self.timestamp) is not None]
+            if high_water is not None:
+                stamps.append(high_water)
+            high_water = json.dumps(max(stamps)) if stamps else None
+
+            stale = any(changes.values())
+            self.db.execute("""INSERT INTO images (image_key, high_water, synced, stale, etag)
+                               VALUES (?, ?, ?, ?, ?)
+                               ON CONFLICT(image_key) DO UPDATE SET
+                                   high_water = excluded.high_water,
+                                   synced = excluded.synced,
+                                   stale = MAX(stale, excluded.stale),
+                                   etag = excluded.etag""",
+                            (image_key, high_water, time.time(), int(stale), etag))
+        return changes
+
+    def picks(self, image_key=None):
+        """
+        The picks in the store, for one image or for all of them.
+        """
+        if image_key is None:
+            rows = self.db.execute("SELECT data FROM picks")
+        else:
+            rows = self.db.execute("SELECT data FROM picks WHERE image_key = ?",
+                                   (image_key,))
+        return [Pick(json.loads(data)) for data, in rows]
+
+    def stale_images(self):
+        """
+        The keys of the images whose heatmaps need redrawing.
+        """
+        rows = self.db.execute("SELECT image_key FROM images WHERE stale = 1")
+        return [key for key, in rows]
+
+    def mark_fresh(self, image_key):
+        """
+        Record that the heatmap for an image has been redrawn.
+        """
+        with self.db:
+            self.db.execute("UPDATE images SET stale = 0 WHERE image_key = ?",
+                            (image_key,))
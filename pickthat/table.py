@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A columnar table of picks, with all coordinates in one array.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .categories import COHORTS, USERS
+
+Interpretation = namedtuple('Interpretation',
+                            ['user_id', 'cohort', 'image_key', 'picks'])
+
+
+def pack_coords(all_picks):
+    """
+    Stack the coordinates of many interpretations into one array.
+
+    Args:
+        all_picks (iterable): The coordinates of each interpretation, as
+            sequences of (x, y) or (x, y, group) rows.
+
+    Returns:
+        tuple. An int32 array of (x, y, group) rows, with group -1 where
+            there was none; the CSR offsets of the interpretations; and
+            the number of columns each one had.
+    """
+    coords, offsets, ncols = [], [0], []
+    for picks in all_picks:
+        xy = np.asarray(picks, dtype=np.int32)
+        xy = xy.reshape(-1, xy.shape[-1] if xy.size else 2)
+        rows = np.full((xy.shape[0], 3), -1, dtype=np.int32)
+        rows[:, :xy.shape[1]] = xy
+        coords.append(rows)
+        offsets.append(offsets[-1] + rows.shape[0])
+        ncols.append(xy.shape[1])
+
+    if coords:
+        coords = np.concatenate(coords)
+    else:
+        coords = np.zeros((0, 3), dtype=np.int32)
+    return (coords,
+            np.array(offsets, dtype=np.int64),
+            np.array(ncols, dtype=np.uint8))
+
+
+class PickTable(object):
+    """
+    Many interpretations in a few arrays.
+
+    The (x, y, group) rows of every interpretation are in one int32
+    array, coords. Interpretation i is coords[starts[i]:stops[i]], and
+    user_code, cohort_code and image_key are parallel arrays with one
+    entry per interpretation. Users and cohorts are stored as int32
+    codes in the shared USERS and COHORTS categories, so filtering by
+    them compares integers; user_id and cohort decode them. Filtering
+    makes a new table of the selected rows that shares the coords
+    array, so nothing is copied, and the coordinates of each
+    interpretation are views into it.
+
+    Args:
+        coords (ndarray): The (x, y, group) rows, shape (N, 3).
+        offsets (ndarray): The CSR offsets of the interpretations.
+        user_id (array-like): The user of each interpretation.
+        cohort (array-like): The cohort of each interpretation.
+        image_key (array-like): The image of each interpretation.
+        ncols (ndarray): The number of columns, 2 or 3, each
+            interpretation had. Defaults to 3.
+    """
+    def __init__(self, coords, offsets, user_id, cohort, image_key, ncols=None):
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self.coords = coords
+        self.starts = offsets[:-1]
+        self.stops = offsets[1:]
+        self.user_code = USERS.encode(user_id)
+        self.cohort_code = COHORTS.encode(cohort)
+        self.image_key = np.asarray(image_key, dtype=object)
+        if ncols is None:
+            ncols = np.full(len(self.starts), 3, dtype=np.uint8)
+        self.ncols = np.asarray(ncols, dtype=np.uint8)
+
+    @classmethod
+    def from_picks(cls, picks, image_key=None):
+        """
+        Make a table from some Picks.
+
+        Args:
+            picks (iterable): The Picks.
+            image_key (str): The image the picks belong to. Defaults to
+                the image_key of each pick.
+        """
+        picks = list(picks)
+        coords, offsets, ncols = pack_coords(p.picks for p in picks)
+        keys = [image_key or getattr(p, 'image_key', None) for p in picks]
+        return cls(coords, offsets,
+                   user_id=[getattr(p, 'user_id', None) for p in picks],
+                   cohort=[getattr(p, 'cohort', None) for p in picks],
+                   image_key=keys,
+                   ncols=ncols)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Make a table of all the picks in a Corpus or PickIndex.
+        """
+        picks, keys = [], []
+        for key in corpus.image_keys:
+            these = corpus.picks_for_image(key)
+            picks.extend(these)
+            keys.extend([key] * len(these))
+        table = cls.from_picks(picks)
+        table.image_key = np.asarray(keys, dtype=object)
+        return table
+
+    def __getstate__(self):
+        """
+        The codes only mean something in this process, so pickle the
+        users and cohorts they stand for, once each, and which of them
+        each interpretation has.
+        """
+        state = dict(self.__dict__)
+        for name, categories in (('user_code', USERS), ('cohort_code', COHORTS)):
+            codes, inverse = np.unique(state.pop(name), return_inverse=True)
+            values = [categories.value(code) for code in codes]
+            state[name] = (values, inverse.astype(np.int32))
+        return state
+
+    def __setstate__(self, state):
+        for name, categories in (('user_code', USERS), ('cohort_code', COHORTS)):
+            values, inverse = state[name]
+            state[name] = categories.encode(values)[inverse]
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return "PickTable({} interpretations, {} points)".format(len(self), self.npoints)
+
+    @property
+    def user_id(self):
+        return USERS.decode(self.user_code)
+
+    @property
+    def cohort(self):
+        return COHORTS.decode(self.cohort_code)
+
+    @property
+    def npoints(self):
+        return int((self.stops - self.starts).sum())
+
+    @property
+    def lengths(self):
+        return self.stops - self.starts
+
+    def picks(self, i):
+        """
+        The coordinates of interpretation i, as a view into coords.
+        """
+        return self.coords[self.starts[i]:self.stops[i], :self.ncols[i]]
+
+    def __iter__(self):
+        """
+        Yield each interpretation, with its user_id, cohort, image_key
+        and picks. Image.heatmap() can use these like Picks.
+        """
+        for i in range(len(self)):
+            yield Interpretation(USERS.value(self.user_code[i]),
+                                 COHORTS.value(self.cohort_code[i]),
+                                 self.image_key[i],
+                                 self.picks(i))
+
+    def __getitem__(self, index):
+        """
+        Select interpretations by index, slice or boolean mask. The new
+        table shares this one's coords.
+        """
+        if isinstance(index, (int, np.integer)):
+            index = [index]
+        new = object.__new__(PickTable)
+        new.coords = self.coords
+        for name in ('starts', 'stops', 'user_code', 'cohort_code', 'image_key', 'ncols'):
+            setattr(new, name, getattr(self, name)[index])
+        return new
+
+    def mask(self, user_id=None, cohort=None, image_key=None):
+        """
+        A boolean mask of the interpretations that match all of the
+        given values.
+        """
+        m = np.ones(len(self), dtype=bool)
+        if user_id is not None:
+            m &= (self.user_code == USERS.code(user_id, add=False))
+        if cohort is not None:
+            m &= (self.cohort_code == COHORTS.code(cohort, add=False))
+        if image_key is not None:
+            m &= (self.image_key == image_key)
+        return m
+
+    def where(self, user_id=None, cohort=None, image_key=None):
+        """
+        The interpretations that match all of the given values.
+        """
+        return self[self.mask(user_id=user_id, cohort=cohort, image_key=image_key)]
+
+    def by_user(self):
+        """
+        A dict of the coordinates of each user's interpretation(s), as
+        lists of views.
+        """
+        result = {}
+        for i, code in enumerate(self.user_code):
+            result.setdefault(USERS.value(code), []).append(self.picks(i))
+        return result
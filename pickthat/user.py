@@ -6,11 +6,12 @@ An object to hold a user.
 :copyright: 2015 Agile Geoscience
 :license: Apache 2.0
 """
+from .record import Record
 
 
-class User(object):
-    def __init__(self, data):
-        self.__dict__ = dict(data)
-        for k, v in data.items():
-            if k and v:
-                setattr(self, k, v)
+class User(Record):
+    __slots__ = ('user_id',
+                 'nickname',
+                 'cohort',
+                 'created',
+                 )
@@ -21,18 +21,27 @@ else:
 REQUIREMENTS = ['numpy',
                 'matplotlib',
                 'pillow',
+                'requests',
                 'shapely',
                 ]
 
+EXTRAS = {'fast': ['scipy'],
+          }
+
 CLASSIFIERS = ['Development Status :: 4 - Beta',
                'Intended Audience :: Science/Research',
                'Natural Language :: English',
                'License :: OSI Approved :: Apache Software License',
                'Operating System :: OS Independent',
                'Programming Language :: Python',
-               'Programming Language :: Python :: 2.7',
-               'Programming Language :: Python :: 3.3',
-               'Programming Language :: Python :: 3.4',
+               'Programming Language :: Python :: 3',
+               'Programming Language :: Python :: 3 :: Only',
+               'Programming Language :: Python :: 3.7',
+               'Programming Language :: Python :: 3.8',
+               'Programming Language :: Python :: 3.9',
+               'Programming Language :: Python :: 3.10',
+               'Programming Language :: Python :: 3.11',
+               'Programming Language :: Python :: 3.12',
                ]
 
 setup(name='pickthat',
@@ -44,7 +53,9 @@ setup(name='pickthat',
       license='Apache 2',
       packages=['pickthat'],
       tests_require=['pytest', 'pytest-mpl'],
+      python_requires='>=3.7',
       install_requires=REQUIREMENTS,
+      extras_require=EXTRAS,
       classifiers=CLASSIFIERS,
       zip_safe=False,
       )
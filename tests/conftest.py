@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Shared test setup: the tests use the local stand-in for the API in
+benchmarks/fakeserver.py, and the reference implementations in
+benchmarks/reference.py.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'benchmarks'))
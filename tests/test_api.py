@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the API client, against the local stand-in server.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fakeserver import serve
+
+from pickthat import API, AsyncAPI
+from pickthat.ratelimit import AdaptiveLimiter
+
+
+def test_instrument_retries():
+    """
+    Attempts the limiter retries are recorded, each with its own time
+    to first byte.
+    """
+    latency = 0.05
+    server, url = serve(latency=latency, capacity=1, n_images=4)
+    limiter = AdaptiveLimiter(window=4, backoff=0.05)
+    with API(url, instrument=True, limiter=limiter) as api:
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(api.picks, ['image{}'.format(i) for i in range(4)]))
+        stats = api.instrument.snapshot()['api/picks']
+
+    assert limiter.throttled > 0
+    assert stats['status'] == {200: 4, 429: limiter.throttled}
+    assert stats['requests'] == 4 + limiter.throttled
+    assert stats['mean_ttfb'] < 2 * latency
+    server.shutdown()
+
+
+def test_instrument_iter_picks():
+    """
+    Streamed picks are recorded like any other request.
+    """
+    server, url = serve(n_images=1)
+    with API(url, instrument=True) as api:
+        streamed = list(api.iter_picks('image0'))
+        stats = api.instrument.snapshot()['api/picks']
+        assert stats['status'] == {200: 1}
+        assert stats['objects'] == len(streamed) > 0
+        assert stats['bytes'] == server.bytes_sent
+        assert stats['download'] >= 0 and stats['decode'] >= 0
+        assert stats['ttfb'] > 0
+
+        # Stopping early still records the request, once.
+        picks = api.iter_picks('image0')
+        next(picks)
+        picks.close()
+        assert api.instrument.snapshot()['api/picks']['requests'] == 2
+    server.shutdown()
+
+
+def test_async_picks_cohort():
+    server, url = serve(n_images=1)
+
+    async def fetch():
+        async with AsyncAPI(url) as api:
+            everyone = await api.picks(image_id='image0')
+            students = await api.picks(image_id='image0', cohort='student')
+            return everyone, students
+
+    everyone, students = asyncio.run(fetch())
+    assert 0 < len(students) < len(everyone)
+    assert all(p.cohort == 'student' for p in students)
+    server.shutdown()
+
+
+def test_keep_alive_session():
+    """
+    Turning keep-alive off doesn't touch a session the caller passed.
+    """
+    session = requests.Session()
+    before = dict(session.headers)
+    api = API('http://localhost/', keep_alive=False, session=session)
+    assert dict(session.headers) == before
+    assert api.headers['Connection'] == 'close'
+
+    api = API('http://localhost/', keep_alive=False)
+    assert api.session.headers['Connection'] == 'close'
+    api.close()
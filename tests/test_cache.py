@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the on-disk response cache.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import os
+import time
+
+from fakeserver import serve
+
+from pickthat import API
+from pickthat.cache import ResponseCache
+
+
+def disk_size(path):
+    return sum(os.path.getsize(os.path.join(path, f))
+               for f in os.listdir(path) if f.endswith('.json'))
+
+
+def test_ttl(tmpdir):
+    cache = ResponseCache(str(tmpdir), ttl=60)
+    entry = cache.put(cache.key('url'), [1, 2])
+    assert cache.is_fresh(cache.get(cache.key('url')))
+    entry['time'] -= 61
+    assert not cache.is_fresh(entry)
+    assert cache.is_fresh(cache.refresh(cache.key('url'), entry))
+
+    assert ResponseCache(str(tmpdir), ttl=None).is_fresh(entry)
+    assert not ResponseCache(str(tmpdir), ttl=0).is_fresh(entry)
+    assert cache.get(cache.key('other')) is None
+
+
+def test_conditional_headers(tmpdir):
+    cache = ResponseCache(str(tmpdir))
+    entry = cache.put('k', [], etag='"abc"', last_modified='Wed, 01 Jan 2015 00:00:00 GMT')
+    assert cache.conditional_headers(entry) == {
+        'If-None-Match': '"abc"',
+        'If-Modified-Since': 'Wed, 01 Jan 2015 00:00:00 GMT',
+    }
+    assert cache.conditional_headers(cache.put('k', [])) == {}
+
+
+def expire(cache, key):
+    entry = cache.get(key)
+    entry['time'] -= cache.ttl + 1
+    cache._write(key, entry)
+
+
+def test_etag_refresh(tmpdir):
+    """
+    A stale entry is revalidated with its ETag, and a 304 refreshes it.
+    """
+    server, url = serve(n_images=2)
+    path = str(tmpdir)
+    with API(url, cache=ResponseCache(path, ttl=60)) as api:
+        key = api.cache.key(url + 'api/picks', {'image_key': 'image0', 'all': 1})
+        first = api.picks('image0')
+        body = server.bytes_sent
+        expire(api.cache, key)
+        requests = server.requests
+        again = api.picks('image0')
+        assert server.requests == requests + 1
+        assert server.bytes_sent == body  # 304, no body.
+        assert [p.as_dict() for p in again] == [p.as_dict() for p in first]
+        assert api.cache.is_fresh(api.cache.get(key))
+
+        # Changed on the server, so fetched again.
+        server.picks['image0'].pop()
+        expire(api.cache, key)
+        assert len(api.picks('image0')) == len(first) - 1
+    server.shutdown()
+
+
+def test_eviction(tmpdir):
+    path = str(tmpdir)
+    cache = ResponseCache(path, max_bytes=2000)
+    keys = [cache.key('url', {'i': i}) for i in range(50)]
+    for i, key in enumerate(keys):
+        cache.put(key, list(range(30)))
+        assert disk_size(path) <= 2000
+        assert cache._total == disk_size(path)
+
+        # Keep the first entry in use, so it is never the oldest.
+        os.utime(cache._file(keys[0]), (time.time() + 1, time.time() + 1))
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[-1]) is not None
+    assert cache.get(keys[1]) is None
+
+
+def test_total_across_reopen(tmpdir):
+    path = str(tmpdir)
+    cache = ResponseCache(path)
+    cache.put('a', list(range(100)))
+    cache.put('b', list(range(10)))
+    cache.put('a', list(range(5)))  # Overwrites.
+    assert cache._total == disk_size(path)
+
+    reopened = ResponseCache(path)
+    assert reopened._total == cache._total
+
+    reopened.clear()
+    assert reopened._total == 0
+    assert disk_size(path) == 0
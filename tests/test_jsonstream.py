@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the streaming JSON array decoder.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import json
+
+import pytest
+
+from pickthat.jsonstream import iter_json_array
+
+
+def chunked(doc, size):
+    return [doc[i:i+size] for i in range(0, len(doc), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 100])
+@pytest.mark.parametrize('doc', ['[]',
+                                 ' [ ] ',
+                                 '[1, 2.5, -3e2]',
+                                 '[{"a": [1, 2]}, "x,]", null, true]\n',
+                                 '[[1, 2], [3, 4]]',
+                                 ])
+def test_iter_json_array(doc, size):
+    assert list(iter_json_array(chunked(doc, size))) == json.loads(doc)
+    encoded = [c.encode('utf-8') for c in chunked(doc, size)]
+    assert list(iter_json_array(encoded)) == json.loads(doc)
+
+
+@pytest.mark.parametrize('size', [1, 2, 100])
+@pytest.mark.parametrize('doc', ['',
+                                 '{}',
+                                 '[',
+                                 '[1',
+                                 '[1,',
+                                 '[1 2]',
+                                 '[1,,2]',
+                                 '[1,]',
+                                 '[,1]',
+                                 '[1]]',
+                                 '[1, 2] x',
+                                 ])
+def test_iter_json_array_malformed(doc, size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(doc, size)))
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for Pick and PickTable.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import os
+import pickle
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+import pickthat
+from pickthat.categories import USERS
+from pickthat.pick import Pick
+from pickthat.table import PickTable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(pickthat.__file__)))
+
+# Unpickles an object from stdin in a process that has already seen
+# some other users, then prints the users and cohorts it got.
+UNPICKLE = """
+import pickle, sys
+from pickthat.categories import USERS, COHORTS
+for user in ('bob', 'carol', 'dave'):
+    USERS.code(user)
+COHORTS.code('professional')
+obj = pickle.loads(sys.stdin.buffer.read())
+print(obj.{})
+"""
+
+
+def unpickle_elsewhere(obj, expression):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, '-c', UNPICKLE.format(expression)],
+                         input=pickle.dumps(obj),
+                         stdout=subprocess.PIPE,
+                         env=env,
+                         check=True)
+    return out.stdout.decode('utf-8').strip()
+
+
+def test_picks_threads():
+    """
+    Threads reading the picks for the first time all get them.
+    """
+    picks = [Pick({'picks': '[[1, 2], [3, 4]]'}) for _ in range(200)]
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def read():
+        barrier.wait()
+        for pick in picks:
+            try:
+                assert pick.picks.tolist() == [[1, 2], [3, 4]]
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def test_pick_pickle():
+    pick = Pick({'user_id': 'alice', 'cohort': 'student', 'picks': [[1, 2], [3, 4]]})
+    copy = pickle.loads(pickle.dumps(pick))
+    assert copy.as_dict() == pick.as_dict()
+
+    # Decoded, and with fields that aren't slots.
+    pick.picks
+    pick.extra = 'x'
+    copy = pickle.loads(pickle.dumps(pick))
+    assert (copy.picks == pick.picks).all()
+    assert copy.extra == 'x'
+
+    assert unpickle_elsewhere(pick, 'user_id, obj.cohort') == 'alice student'
+
+
+def test_picktable_pickle():
+    picks = [Pick({'user_id': u, 'cohort': c, 'picks': [[i, i], [i + 1, i]]})
+             for i, (u, c) in enumerate([('alice', 'student'),
+                                         ('erin', None),
+                                         ('alice', 'student')])]
+    table = PickTable.from_picks(picks, image_key='image0')
+    copy = pickle.loads(pickle.dumps(table))
+    assert list(copy.user_id) == ['alice', 'erin', 'alice']
+    assert list(copy.cohort) == ['student', None, 'student']
+    assert (copy.coords == table.coords).all()
+    assert (copy.user_code == USERS.code('alice')).sum() == 2
+
+    result = unpickle_elsewhere(table, 'user_id.tolist(), obj.cohort.tolist()')
+    assert result == "['alice', 'erin', 'alice'] ['student', None, 'student']"
+
+    empty = pickle.loads(pickle.dumps(table.where(user_id='nobody')))
+    assert len(empty) == 0
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the heatmap functions in pt.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import numpy as np
+import pytest
+
+from pickthat import pt
+from pickthat.image import Image
+from pickthat.mmorph import dilate, sedisk
+from pickthat.pick import Pick
+
+from reference import draw_loop
+
+
+def random_image(rng, max_size=200):
+    w, h = rng.randint(1, max_size, 2)
+    style = rng.choice(['lines', 'polygons'])
+    return Image({'width': w, 'height': h, 'pickstyle': style})
+
+
+def test_draw_pick_to_user_layer():
+    """
+    The vectorized rasterizer draws the same pixels as the loop.
+    """
+    rng = np.random.RandomState(0)
+    for _ in range(2000):
+        image = random_image(rng)
+        w, h = image.width, image.height
+        n = rng.randint(1, 10)
+        picks = np.c_[rng.randint(0, w + 3, n), rng.randint(0, h + 3, n)]
+        a = draw_loop(np.zeros((h, w), np.float32), picks, image)
+        b = pt.draw_pick_to_user_layer(np.zeros((h, w), np.float32), picks, image)
+        assert (a == b).all(), picks
+
+
+def test_draw_pick_to_user_layer_floats():
+    rng = np.random.RandomState(1)
+    for _ in range(2000):
+        image = random_image(rng)
+        w, h = image.width, image.height
+        n = rng.randint(2, 10)
+        picks = np.c_[rng.rand(n) * (w - 1), rng.rand(n) * (h - 1)]
+        if rng.rand() < 0.5:
+            picks = np.round(picks, 1)
+        a = draw_loop(np.zeros((h, w), np.float32), picks, image)
+        b = pt.draw_pick_to_user_layer(np.zeros((h, w), np.float32), picks, image)
+        assert (a == b).all(), picks.tolist()
+
+    # Steps of np.arange that are not exactly 1.
+    image = Image({'width': 57, 'height': 51, 'pickstyle': 'polygons'})
+    picks = np.array([[12.7, 3.1], [41.0, 40.1], [14.8, 14.0], [45.9, 38.7]])
+    a = draw_loop(np.zeros((51, 57), np.float32), picks, image)
+    b = pt.draw_pick_to_user_layer(np.zeros((51, 57), np.float32), picks, image)
+    assert (a == b).all()
+
+
+def test_draw_all_picks_to_user_layer():
+    """
+    Every group of picks is drawn, each as its own feature.
+    """
+    rng = np.random.RandomState(2)
+    for _ in range(1000):
+        image = random_image(rng)
+        w, h = image.width, image.height
+        n = rng.randint(1, 20)
+        picks = np.c_[rng.randint(0, w, n), rng.randint(0, h, n), rng.randint(0, 4, n)]
+        a = np.zeros((h, w), np.float32)
+        for group in np.unique(picks[:, 2]):
+            draw_loop(a, picks[picks[:, 2] == group], image)
+        b = pt.draw_all_picks_to_user_layer(np.zeros((h, w), np.float32), picks, image)
+        assert (a == b).all(), picks
+
+
+def random_layers(rng, n=300):
+    """
+    Random 0/1 layers of various densities, and disk radii.
+    """
+    for _ in range(n):
+        h, w = rng.randint(1, 80, 2)
+        density = rng.choice([0, 0.001, 0.01, 0.2])
+        yield (rng.rand(h, w) < density).astype(int), rng.randint(0, 12)
+
+
+@pytest.mark.skipif(pt.distance_transform_edt is None, reason="needs scipy")
+def test_dilate_disk_edt():
+    """
+    The distance transform gives the same pixels as dilating by sedisk.
+    """
+    rng = np.random.RandomState(3)
+    for f, r in random_layers(rng):
+        expected = dilate(f, B=sedisk(r=r))
+        result = pt.dilate_disk(f, r, method='edt')
+        assert result.dtype == f.dtype
+        assert (result == expected).all(), (f.shape, r)
+
+    f = np.zeros((5, 5), np.float32)
+    f[2, 2] = 1
+    assert pt.dilate_disk(f, 1, method='edt').dtype == np.float32
+
+
+def test_dilate_disk_sparse(monkeypatch):
+    """
+    Stamping disks gives the same pixels as dilating by sedisk, and so
+    does whichever method 'auto' picks.
+    """
+    rng = np.random.RandomState(4)
+    for f, r in random_layers(rng):
+        expected = dilate(f, B=sedisk(r=r))
+        for method in ('sparse', 'auto'):
+            result = pt.dilate_disk(f, r, method=method)
+            assert result.dtype == f.dtype
+            assert (result == expected).all(), (f.shape, r, method)
+
+    # Stamping a few pixels at a time.
+    monkeypatch.setattr(pt, 'SPARSE_CHUNK', 7)
+    f = (rng.rand(50, 60) < 0.05).astype(int)
+    assert (pt.dilate_disk(f, 4, method='sparse') == dilate(f, B=sedisk(r=4))).all()
+
+
+def full_layer(image, picks, scale=1):
+    """
+    A user layer drawn and dilated on the whole image, as a reference.
+    """
+    if scale > 1:
+        image = pt.ReducedImage(image, scale)
+        picks = picks.copy()
+        picks[:, :2] //= scale
+    layer = np.zeros((image.height, image.width), dtype=np.float32)
+    layer = pt.draw_all_picks_to_user_layer(layer, picks, image)
+    r = pt.calculate_disk_radius(image)
+    return dilate(layer.astype(int), B=sedisk(r=r))
+
+
+def random_picks(rng, image):
+    """
+    Picks anywhere from off the top left to off the bottom right.
+    """
+    w, h = image.width, image.height
+    n = rng.randint(1, 8)
+    picks = np.c_[rng.randint(-w, w + 5, n), rng.randint(-h, h + 5, n)]
+    if rng.rand() < 0.3:
+        picks = np.c_[picks, rng.randint(0, 3, n)]
+    return picks
+
+
+def test_create_user_heatmap_layer():
+    """
+    Computing layers in a window gives the same layers as computing them
+    on the whole image, at the edges and off them too.
+    """
+    rng = np.random.RandomState(5)
+    for _ in range(500):
+        image = random_image(rng, max_size=400)
+        if rng.rand() < 0.2:
+            image.pickstyle = 'points'
+        picks = random_picks(rng, image)
+        scale = rng.choice([1, 1, 2, 4])
+        try:
+            expected = full_layer(image, picks, scale)
+        except IndexError:
+            with pytest.raises(IndexError):
+                pt.create_user_heatmap_layer(image, picks, None, scale=scale)
+            continue
+        layer, cohort = pt.create_user_heatmap_layer(image, picks, 'c', scale=scale)
+        assert cohort == 'c'
+        assert layer.shape == expected.shape
+        assert layer.dtype == expected.dtype
+        assert (layer == expected).all(), (picks, image.width, image.height)
+
+
+def test_create_user_heatmap_window():
+    image = Image({'width': 300, 'height': 200, 'pickstyle': 'lines'})
+    r = pt.calculate_disk_radius(image)
+
+    # A line in the middle, grown by r.
+    window, offset, _ = pt.create_user_heatmap_window(image, [[100, 50], [120, 60]], None)
+    assert offset == (50 - r, 100 - r)
+    assert window.shape == (10 + 2 * r + 1, 20 + 2 * r + 1)
+
+    # Clipped at the corner, with negative indices wrapped to the far one.
+    window, offset, _ = pt.create_user_heatmap_window(image, [[0, 0], [0, 0]], None)
+    assert offset == (0, 0)
+    assert window.shape == (r + 1, r + 1)
+    window, offset, _ = pt.create_user_heatmap_window(image, [[-1, -1], [-1, -1]], None)
+    assert offset == (199 - r, 299 - r)
+    assert window.shape == (r + 1, r + 1)
+
+    # A single point of a line draws nothing.
+    window, offset, _ = pt.create_user_heatmap_window(image, [[10, 10]], None)
+    assert window.shape == (0, 0)
+    layer, _ = pt.create_user_heatmap_layer(image, [[10, 10]], None)
+    assert layer.shape == (200, 300) and not layer.any()
+
+
+def test_heatmap():
+    """
+    Image.heatmap() adds up the windows where they belong.
+    """
+    rng = np.random.RandomState(6)
+    image = Image({'width': 300, 'height': 200, 'pickstyle': 'lines'})
+    picks = []
+    for i in range(6):
+        pick = Pick({'user_id': str(i), 'cohort': 'a' if i % 2 else 'b'})
+        pick.picks = np.c_[rng.randint(0, 300, 4), rng.randint(0, 200, 4)]
+        picks.append(pick)
+    # One at the edges of the image.
+    picks[0].picks = np.array([[0, 199], [299, 199], [299, 0]])
+
+    for scale in (1, 2):
+        for cohort in (None, 'a'):
+            chosen = [p for p in picks if cohort in (None, p.cohort)]
+            total = sum(full_layer(image, p.picks, scale) for p in chosen)
+            expected = np.asarray(pt.convert_array_to_image(total))
+            result = np.asarray(image.heatmap(picks, cohort=cohort, scale=scale))
+            assert (result == expected).all()
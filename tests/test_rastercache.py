@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the two-level raster cache.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image as PImage
+
+from pickthat.rastercache import RasterCache
+
+
+def encoded(seed, size=(64, 48)):
+    rng = np.random.RandomState(seed)
+    pixels = rng.randint(0, 255, size[::-1] + (3,)).astype(np.uint8)
+    buf = BytesIO()
+    PImage.fromarray(pixels).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class Fetcher(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        return encoded(int(url.rsplit('/', 1)[-1]))
+
+
+def disk_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def test_disk_reuse(tmpdir):
+    fetch = Fetcher()
+    cache = RasterCache(path=str(tmpdir))
+    im = cache.get('http://x/1', fetch)
+    assert not any(f.endswith('.px') for f in os.listdir(str(tmpdir)))
+
+    again = RasterCache(path=str(tmpdir)).get('http://x/1', fetch)
+    assert fetch.calls == 1
+    assert (np.asarray(again) == np.asarray(im)).all()
+
+
+def test_raw(tmpdir):
+    fetch = Fetcher()
+    im = RasterCache(path=str(tmpdir), raw=True).get('http://x/1', fetch)
+    assert any(f.endswith('.px') for f in os.listdir(str(tmpdir)))
+
+    again = RasterCache(path=str(tmpdir)).get('http://x/1', fetch)
+    assert fetch.calls == 1
+    assert (np.asarray(again) == np.asarray(im)).all()
+
+
+def test_disk_eviction(tmpdir):
+    path = str(tmpdir)
+    fetch = Fetcher()
+    size = len(encoded(0))
+    cache = RasterCache(path=path, max_disk_bytes=int(2.5 * size), raw=True)
+    for i in range(3):
+        cache.get('http://x/{}'.format(i), fetch)
+        # Make each image older than the next, whatever the clock's resolution.
+        for f in os.listdir(path):
+            os.utime(os.path.join(path, f), (i, i))
+        cache.clear()
+        assert disk_size(path) <= cache.max_disk_bytes
+        assert cache._disk_total == disk_size(path)
+
+    # The oldest went, the newest stayed.
+    cache.get('http://x/2', fetch)
+    assert fetch.calls == 3
+    cache.get('http://x/0', fetch)
+    assert fetch.calls == 4
+
+    # The total is rebuilt from the files on reopening.
+    assert RasterCache(path=path)._disk_total == disk_size(path)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the adaptive rate limiter.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import pytest
+import requests
+
+from pickthat.ratelimit import AdaptiveLimiter
+
+
+class Response(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+
+def flaky(outcomes):
+    """
+    A request that raises or returns each of outcomes in turn.
+    """
+    outcomes = iter(outcomes)
+
+    def func():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+    return func
+
+
+@pytest.mark.parametrize('error', [requests.ConnectionError(), requests.Timeout()])
+def test_call_retries_transport_errors(error):
+    limiter = AdaptiveLimiter(window=4, backoff=0.001)
+    response = limiter.call(flaky([error, 503, error, 200]))
+    assert response.status_code == 200
+    assert limiter.throttled == 3
+    assert limiter.window == 2  # Halved to 1, then grown by a success.
+    assert limiter.in_flight == 0
+
+
+def test_call_gives_up():
+    limiter = AdaptiveLimiter(retries=2, backoff=0.001)
+    with pytest.raises(requests.ConnectionError):
+        limiter.call(flaky([requests.ConnectionError()] * 3))
+    assert limiter.in_flight == 0
+
+    limiter = AdaptiveLimiter(retries=2, backoff=0.001)
+    assert limiter.call(flaky([429, 429, 429])).status_code == 429
+
+    # Other errors are not retried.
+    with pytest.raises(ValueError):
+        limiter.call(flaky([ValueError(), 200]))
+    assert limiter.in_flight == 0
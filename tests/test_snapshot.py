@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for saving and loading snapshots of a corpus.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import numpy as np
+import pytest
+
+from pickthat.corpus import Corpus
+from pickthat.image import Image
+from pickthat.pick import Pick
+from pickthat.snapshot import load_snapshot, save_snapshot
+from pickthat.user import User
+
+
+def make_corpus():
+    corpus = Corpus()
+    for key in ('image0', 'image1', 'image2'):
+        corpus.add_image(Image({'id': key, 'width': 80, 'height': 60,
+                                'pickstyle': 'lines', 'title': key}))
+    corpus.add_user(User({'user_id': 'alice', 'cohort': 'student'}))
+    corpus.add_user(User({'user_id': 'bob', 'cohort': None}))
+
+    corpus.add_picks('image0', [
+        Pick({'user_id': 'alice', 'cohort': 'student', 'picks': [[1, 2], [3, 4]]}),
+        Pick({'user_id': 'bob', 'picks': [[5, 6, 0], [7, 8, 0], [9, 10, 1]]}),
+    ])
+    corpus.add_picks('image1', [
+        Pick({'user_id': 'alice', 'cohort': 'student', 'picks': []}),
+    ])
+    return corpus
+
+
+def picks_by_image(corpus):
+    result = {}
+    for key in corpus.image_keys:
+        result[key] = [(p.user_id, getattr(p, 'cohort', None),
+                        np.asarray(p.picks).tolist())
+                       for p in corpus.picks_for_image(key)]
+    return result
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(tmpdir, mmap):
+    corpus = make_corpus()
+    path = str(tmpdir.join('corpus.npz'))
+    save_snapshot(path, corpus)
+    loaded = load_snapshot(path, mmap=mmap)
+
+    assert picks_by_image(loaded) == picks_by_image(corpus)
+    assert ({k: i.as_dict() for k, i in loaded.images.items()} ==
+            {k: i.as_dict() for k, i in corpus.images.items()})
+    assert ({k: u.as_dict() for k, u in loaded.users.items()} ==
+            {k: u.as_dict() for k, u in corpus.users.items()})
+
+    # Two-column picks stay two columns, three stay three.
+    alice, bob = loaded.picks_for_image('image0')
+    assert alice.picks.shape == (2, 2)
+    assert bob.picks.shape == (3, 3)
+
+    if mmap:
+        assert isinstance(alice.picks.base, np.memmap)
+        assert not alice.picks.flags.writeable
+
+    assert len(loaded.picks_for_user('alice')) == 2
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip_empty(tmpdir, mmap):
+    path = str(tmpdir.join('empty.npz'))
+    save_snapshot(path, Corpus())
+    loaded = load_snapshot(path, mmap=mmap)
+    assert len(loaded) == 0
+    assert loaded.images == {}
+    assert loaded.users == {}
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the local pick store and syncing it with the API.
+
+:copyright: 2015 Agile Geoscience
+:license: Apache 2.0
+"""
+import copy
+import sqlite3
+
+import pytest
+from fakeserver import serve
+
+from pickthat import API
+from pickthat.api import PickThisAPIError
+from pickthat.store import PickStore
+
+NO_CHANGES = {'added': [], 'changed': [], 'removed': []}
+
+
+def test_update():
+    store = PickStore()
+    a = {'user_id': 'a', 'picks': [[1, 2]], 'updated': '2015-01-01'}
+    b = {'user_id': 'b', 'picks': [[3, 4]], 'updated': '2015-01-02'}
+    assert store.update('image0', [a, b]) == {'added': ['a', 'b'], 'changed': [], 'removed': []}
+    assert store.stale_images() == ['image0']
+    assert store.high_water('image0') == '2015-01-02'
+
+    store.mark_fresh('image0')
+    assert store.update('image0', [a, b]) == NO_CHANGES
+    assert store.stale_images() == []
+
+    a2 = dict(a, picks=[[5, 6]], updated='2015-01-03')
+    assert store.update('image0', [a2]) == {'added': [], 'changed': ['a'], 'removed': ['b']}
+    assert store.stale_images() == ['image0']
+    assert [p.picks.tolist() for p in store.picks('image0')] == [[[5, 6]]]
+
+    # Only changes, so nothing is removed.
+    c = {'user_id': 'c', 'picks': [[7, 8]]}
+    assert store.update('image0', [c], complete=False)['removed'] == []
+    assert len(store.picks('image0')) == 2
+
+
+def test_high_water_numbers():
+    """
+    Numeric timestamps are compared as numbers, not as text.
+    """
+    store = PickStore()
+    store.update('image0', [{'user_id': 'a', 'updated': 9}])
+    store.update('image0', [{'user_id': 'a', 'updated': 10}])
+    assert store.high_water('image0') == 10
+    store.update('image0', [{'user_id': 'a', 'updated': 2}], complete=False)
+    assert store.high_water('image0') == 10
+    assert store.high_water('image1') is None
+
+
+def test_old_store(tmpdir):
+    """
+    Stores made before images had an etag, and that kept the high-water
+    mark as text, still work.
+    """
+    path = str(tmpdir.join('old.db'))
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE images (image_key TEXT PRIMARY KEY, high_water TEXT,
+                             synced REAL, stale INTEGER NOT NULL DEFAULT 0);
+        INSERT INTO images VALUES ('image0', '2015-01-01', 0, 0);
+    """)
+    db.commit()
+    db.close()
+
+    with PickStore(path) as store:
+        assert store.high_water('image0') == '2015-01-01'
+        assert store.etag('image0') is None
+        store.update('image0', [{'user_id': 'a', 'updated': '2015-02-01'}], etag='"x"')
+        assert store.high_water('image0') == '2015-02-01'
+        assert store.etag('image0') == '"x"'
+
+
+@pytest.fixture
+def server():
+    server, url = serve(n_images=3, n_users=4)
+    yield server, url
+    server.shutdown()
+
+
+def change(server):
+    """
+    Change one pick on image0 and add another.
+    """
+    picks = server.picks['image0']
+    new = copy.deepcopy(picks[0])
+    new['user_id'] = 'newbie'
+    picks.append(new)
+    picks[0]['picks'][0] = [1, 1]
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_sync(server, tmpdir, cached):
+    server, url = server
+    store = PickStore()
+    cache = str(tmpdir.join('cache')) if cached else None
+    with API(url, cache=cache) as api:
+        results = api.sync(store)
+        assert sorted(results) == ['image0', 'image1', 'image2']
+        assert all(len(r['added']) == 4 for r in results.values())
+
+        change(server)
+        results = api.sync(store, ['image0', 'image1'])
+        assert results['image0'] == {'added': ['newbie'], 'changed': ['user0'], 'removed': []}
+        assert results['image1'] == NO_CHANGES
+        assert len(store.picks('image0')) == 5
+
+        del server.picks['image1'][1:]
+        removed = api.sync(store, ['image1'])['image1']['removed']
+        assert sorted(removed) == ['user1', 'user2', 'user3']
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_sync_unchanged(server, tmpdir, monkeypatch, cached):
+    """
+    An image the server says is unchanged is not compared again.
+    """
+    server, url = server
+    store = PickStore()
+    cache = str(tmpdir.join('cache')) if cached else None
+    with API(url, cache=cache) as api:
+        api.sync(store, ['image0', 'image1'])
+        change(server)
+
+        updated = []
+        update = store.update
+        monkeypatch.setattr(store, 'update',
+                            lambda key, *args, **kwargs: updated.append(key) or
+                            update(key, *args, **kwargs))
+        sent = server.bytes_sent
+        results = api.sync(store, ['image0', 'image1'])
+        assert results['image1'] == NO_CHANGES
+        assert updated == ['image0']
+
+        # The unchanged image cost a 304, with no body.
+        body = len(api.session.get(url + 'api/picks',
+                                   params={'image_key': 'image0', 'all': 1}).content)
+        assert server.bytes_sent - sent == 2 * body
+
+
+def test_sync_offline(server, tmpdir):
+    server, url = server
+    cache = str(tmpdir.join('cache'))
+    with API(url, cache=cache) as api:
+        api.sync(PickStore(), ['image0'])
+    with API(url, cache=cache, offline=True) as api:
+        with pytest.raises(PickThisAPIError):
+            api.sync(PickStore(), ['image0'])